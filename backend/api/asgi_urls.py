@@ -0,0 +1,28 @@
+from django.urls import URLPattern, include, path
+
+from core.async_views import run_in_thread_pool
+from .urls import app_name, common_urlpatterns, v1_router  # noqa: F401
+
+ASYNC_ROUTES = (
+    'tags-list',
+    'tags-detail',
+    'ingredients-list',
+    'ingredients-detail',
+    'recipes-list',
+    'recipes-detail',
+    'recipes-download-shopping-cart',
+    'recipes-shopping-cart-summary',
+)
+
+
+def get_async_url(url):
+    if url.name not in ASYNC_ROUTES:
+        return url
+    return URLPattern(url.pattern, run_in_thread_pool(url.callback),
+                      url.default_args, url.name)
+
+
+urlpatterns = [
+    path('', include([get_async_url(url) for url in v1_router.urls])),
+    *common_urlpatterns,
+]
@@ -0,0 +1,324 @@
+import base64
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLResolver, get_resolver
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.cache import bump_cache_version
+from core.constants import (INGREDIENTS_CACHE_NAME, RECIPES_CACHE_NAME,
+                            TAGS_CACHE_NAME)
+from recipes.ingredient_index import ingredient_index
+from recipes.management.commands.generate_data import EMAIL_DOMAIN, PASSWORD
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from users.models import Subscribe, User
+
+PAGE_SIZES = (1, 5, 20)
+BATCH_SIZE = 5
+BATCH_SIZES = (2, BATCH_SIZE)
+NEW_PASSWORD = 'Budget-check-password-1'
+
+# (имя маршрута, метод, URL, тело запроса, ожидаемый статус,
+#  максимум SQL-запросов). В URL подставляются объекты из get_context;
+# {limit} — список проверяется со всеми размерами страницы PAGE_SIZES.
+# Бюджеты не зависят от объема данных: QueryBudgetLargeDataTests
+# проверяет те же числа на данных в несколько раз больше.
+CASES = (
+    ('api-root', 'get', '/api/', None, 200, 1),
+    ('tags-list', 'get', '/api/tags/', None, 200, 2),
+    ('tags-detail', 'get', '/api/tags/{tag}/', None, 200, 2),
+    ('ingredients-list', 'get', '/api/ingredients/?name=а', None, 200, 2),
+    ('ingredients-detail', 'get', '/api/ingredients/{ingredient}/', None,
+     200, 2),
+    ('recipes-list', 'get', '/api/recipes/?limit={limit}', None, 200, 7),
+    ('recipes-list', 'get', '/api/recipes/?cursor=&limit={limit}', None,
+     200, 6),
+    ('recipes-list', 'get', '/api/recipes/?limit={limit}&tags={tag_slug}',
+     None, 200, 9),
+    ('recipes-list', 'get',
+     '/api/recipes/?limit={limit}&is_favorited=1&is_in_shopping_cart=1',
+     None, 200, 7),
+    ('recipes-list', 'get', '/api/recipes/?limit={limit}&author={author}',
+     None, 200, 7),
+    ('recipes-list', 'get', '/api/recipes/?limit={limit}&search=суп',
+     None, 200, 7),
+    ('recipes-list', 'post', '/api/recipes/', 'new_recipe', 201, 19),
+    ('recipes-detail', 'get', '/api/recipes/{recipe}/', None, 200, 6),
+    ('recipes-detail', 'patch', '/api/recipes/{own_recipe}/',
+     'new_recipe', 200, 26),
+    ('recipes-detail', 'delete', '/api/recipes/{own_recipe}/', None,
+     204, 20),
+    ('recipes-feed', 'get', '/api/recipes/feed/?limit={limit}', None,
+     200, 7),
+    ('recipes-favorite', 'post', '/api/recipes/{not_favorited}/favorite/',
+     None, 201, 7),
+    ('recipes-favorite', 'delete', '/api/recipes/{favorited}/favorite/',
+     None, 204, 3),
+    ('recipes-shopping-cart', 'post',
+     '/api/recipes/{not_in_cart}/shopping_cart/', None, 201, 11),
+    ('recipes-shopping-cart', 'delete',
+     '/api/recipes/{in_cart}/shopping_cart/', None, 204, 10),
+    ('recipes-favorite-batch', 'post', '/api/recipes/favorite/',
+     'batch', 200, 7),
+    ('recipes-favorite-batch', 'delete', '/api/recipes/favorite/',
+     'favorited_batch', 200, 4),
+    ('recipes-shopping-cart-batch', 'post', '/api/recipes/shopping_cart/',
+     'batch', 200, 11),
+    ('recipes-shopping-cart-batch', 'delete',
+     '/api/recipes/shopping_cart/', 'cart_batch', 200, 11),
+    ('recipes-shopping-cart-summary', 'get',
+     '/api/recipes/shopping_cart_summary/', None, 200, 3),
+    ('recipes-download-shopping-cart', 'get',
+     '/api/recipes/download_shopping_cart/', None, 200, 3),
+    ('users-subscriptions', 'get',
+     '/api/users/subscriptions/?limit={limit}&recipes_limit=3', None,
+     200, 4),
+    ('users-subscribe', 'post', '/api/users/{not_subscribed}/subscribe/',
+     None, 201, 12),
+    ('users-subscribe', 'delete', '/api/users/{subscribed}/subscribe/',
+     None, 204, 8),
+    ('user-list', 'get', '/api/users/?limit={limit}', None, 200, 4),
+    ('user-list', 'post', '/api/users/', 'new_user', 201, 6),
+    ('user-detail', 'get', '/api/users/{author}/', None, 200, 2),
+    ('user-me', 'get', '/api/users/me/', None, 200, 1),
+    ('user-me', 'patch', '/api/users/me/', 'user_patch', 200, 2),
+    ('user-me', 'delete', '/api/users/me/', 'current_password', 204, 36),
+    ('user-activation', 'post', '/api/users/activation/', 'uid_token',
+     400, 2),
+    ('user-resend-activation', 'post', '/api/users/resend_activation/',
+     'email', 400, 2),
+    ('user-reset-password', 'post', '/api/users/reset_password/', 'email',
+     204, 2),
+    ('user-reset-password-confirm', 'post',
+     '/api/users/reset_password_confirm/', 'uid_token', 400, 2),
+    ('user-reset-username', 'post', '/api/users/reset_email/', 'email',
+     204, 2),
+    ('user-reset-username-confirm', 'post',
+     '/api/users/reset_email_confirm/', 'uid_token', 400, 3),
+    ('user-set-password', 'post', '/api/users/set_password/',
+     'set_password', 204, 2),
+    ('user-set-username', 'post', '/api/users/set_email/', 'set_email',
+     204, 3),
+    ('login', 'post', '/api/auth/token/login/', 'login', 200, 4),
+    ('logout', 'post', '/api/auth/token/logout/', None, 204, 3),
+    ('db-pool-stats', 'get', '/api/metrics/db-pool/', None, 403, 1),
+)
+
+
+def get_route_names(resolver):
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            yield from get_route_names(pattern)
+        elif pattern.name:
+            yield pattern.name
+
+
+def get_image():
+    buffer = BytesIO()
+    Image.new('RGB', (2, 2), '#E26C2D').save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Каждый маршрут API укладывается в заданное число SQL-запросов
+    при разных размерах страницы.
+    """
+    scale = 1
+
+    @classmethod
+    def setUpClass(cls):
+        media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        # Письма со ссылками сброса пароля и почты djoser строит по
+        # шаблонам URL, которых в настройках проекта нет.
+        overridden = override_settings(
+            MEDIA_ROOT=media_root,
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+            DJOSER={
+                **settings.DJOSER,
+                'PASSWORD_RESET_CONFIRM_URL': 'reset/{uid}/{token}',
+                'USERNAME_RESET_CONFIRM_URL': 'reset-email/{uid}/{token}',
+            },
+        )
+        overridden.enable()
+        cls.addClassCleanup(overridden.disable)
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'generate_data', seed=0, users=15 * cls.scale,
+            recipes=30 * cls.scale, favorites=5 * cls.scale,
+            carts=5 * cls.scale, subscriptions=5 * cls.scale,
+            stdout=StringIO(),
+        )
+        cls.user = User.objects.filter(
+            email__endswith=f'@{EMAIL_DOMAIN}', recipes_count__gt=0,
+        ).order_by('id').first()
+        cls.token = Token.objects.create(user=cls.user)
+
+    def get_context(self):
+        user = self.user
+        own_recipe = Recipe.objects.filter(author=user).order_by('id').first()
+        favorited = Favorite.objects.filter(user=user).values('recipe')
+        in_cart = ShoppingCart.objects.filter(user=user).values('recipe')
+        subscribed = Subscribe.objects.filter(user=user).values('subscribing')
+        recipes = Recipe.objects.order_by('id')
+        tag = Tag.objects.order_by('id').first()
+        return {
+            'tag': tag.pk,
+            'tag_slug': tag.slug,
+            'ingredient': Ingredient.objects.order_by('id').first().pk,
+            'recipe': recipes.first().pk,
+            'own_recipe': own_recipe.pk,
+            'author': own_recipe.author_id,
+            'favorited': favorited.first()['recipe'],
+            'not_favorited': recipes.exclude(pk__in=favorited).first().pk,
+            'in_cart': in_cart.first()['recipe'],
+            'not_in_cart': recipes.exclude(pk__in=in_cart).first().pk,
+            'subscribed': subscribed.first()['subscribing'],
+            'not_subscribed': User.objects.exclude(
+                pk__in=subscribed
+            ).exclude(pk=user.pk).order_by('id').first().pk,
+        }
+
+    def get_payloads(self):
+        user = self.user
+        tag = Tag.objects.order_by('id').first()
+        ingredients = Ingredient.objects.order_by('id')[:2]
+        return {
+            'new_recipe': {
+                'ingredients': [
+                    {'id': ingredient.pk, 'amount': 10}
+                    for ingredient in ingredients
+                ],
+                'tags': [tag.pk],
+                'image': get_image(),
+                'name': 'Проверочный рецепт',
+                'text': 'Описание',
+                'cooking_time': 10,
+            },
+            'batch': {'recipes': list(
+                Recipe.objects.order_by('id').values_list(
+                    'id', flat=True
+                )[:BATCH_SIZE]
+            )},
+            # Удаляются рецепты, которые есть в списке: самый дорогой путь.
+            'favorited_batch': {'recipes': list(
+                Favorite.objects.filter(user=user).order_by('id').values_list(
+                    'recipe', flat=True
+                )[:BATCH_SIZE]
+            )},
+            'cart_batch': {'recipes': list(
+                ShoppingCart.objects.filter(user=user).order_by(
+                    'id'
+                ).values_list('recipe', flat=True)[:BATCH_SIZE]
+            )},
+            'new_user': {
+                'email': 'budget@foodgram.ru',
+                'username': 'budget',
+                'first_name': 'Бюджет',
+                'last_name': 'Запросов',
+                'password': NEW_PASSWORD,
+            },
+            'user_patch': {'first_name': 'Бюджет'},
+            'current_password': {'current_password': PASSWORD},
+            'uid_token': {'uid': 'MQ', 'token': 'invalid', 'new_password':
+                          NEW_PASSWORD, 'new_email': 'new@foodgram.ru'},
+            'email': {'email': user.email},
+            'set_password': {'current_password': PASSWORD,
+                             'new_password': NEW_PASSWORD},
+            'set_email': {'current_password': PASSWORD,
+                          'new_email': 'new@foodgram.ru'},
+            'login': {'email': user.email, 'password': PASSWORD},
+        }
+
+    def test_every_route_has_budget(self):
+        uncovered = (
+            set(get_route_names(get_resolver('api.urls')))
+            - {case[0] for case in CASES}
+        )
+        self.assertFalse(
+            uncovered,
+            f"Маршруты без бюджета запросов: {', '.join(sorted(uncovered))}",
+        )
+
+    def test_query_budgets(self):
+        context = self.get_context()
+        payloads = self.get_payloads()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        for name, method, url, payload, status, budget in CASES:
+            if '{limit}' in url:
+                urls = [url.format(**context, limit=size)
+                        for size in PAGE_SIZES]
+            else:
+                urls = [url.format(**context)]
+            for url in urls:
+                with self.subTest(route=name, method=method, url=url):
+                    response, queries = self.request(
+                        client, method, url, payloads.get(payload)
+                    )
+                    self.assertEqual(response.status_code, status)
+                    self.assertLessEqual(
+                        len(queries), budget,
+                        '\n'.join(queries),
+                    )
+
+    def test_batch_queries_do_not_depend_on_batch_size(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        for model, url in ((Favorite, '/api/recipes/favorite/'),
+                           (ShoppingCart, '/api/recipes/shopping_cart/')):
+            listed = model.objects.filter(user=self.user).order_by(
+                'id'
+            ).values_list('recipe', flat=True)
+            not_listed = Recipe.objects.exclude(pk__in=listed).order_by(
+                'id'
+            ).values_list('id', flat=True)
+            for method, recipes in (('post', not_listed), ('delete', listed)):
+                queries = []
+                for size in BATCH_SIZES:
+                    response, captured = self.request(
+                        client, method, url, {'recipes': list(recipes[:size])}
+                    )
+                    self.assertEqual(response.status_code, 200)
+                    queries.append(len(captured))
+                with self.subTest(url=url, method=method):
+                    self.assertEqual(
+                        queries, [queries[0]] * len(BATCH_SIZES)
+                    )
+
+    def request(self, client, method, url, data):
+        """Запрос в откатываемой транзакции, с пустыми кэшами."""
+        for cache_name in (INGREDIENTS_CACHE_NAME, TAGS_CACHE_NAME,
+                           RECIPES_CACHE_NAME):
+            bump_cache_version(cache_name)
+        ingredient_index.invalidate()
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as captured:
+                response = getattr(client, method)(url, data, format='json')
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            transaction.set_rollback(True)
+        return response, [query['sql'] for query in captured.captured_queries]
+
+
+class QueryBudgetLargeDataTests(QueryBudgetTests):
+    """
+    Те же бюджеты при втрое большем числе пользователей, рецептов,
+    избранного, списков покупок и подписок: число запросов не растет
+    вместе с данными.
+    """
+    scale = 3
@@ -1,6 +1,7 @@
 from django.urls import include, path
 from rest_framework import routers
 
+from core.views import db_pool_stats
 from recipes.views import IngredientViewSet, RecipeViewSet, TagViewSet
 from users.views import UserViewSet
 
@@ -14,8 +15,13 @@ v1_router.register('ingredients', IngredientViewSet, basename='ingredients')
 v1_router.register('recipes', RecipeViewSet, basename='recipes')
 
 
-urlpatterns = [
-    path('', include(v1_router.urls)),
+common_urlpatterns = [
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
+    path('metrics/db-pool/', db_pool_stats, name='db-pool-stats'),
+]
+
+urlpatterns = [
+    path('', include(v1_router.urls)),
+    *common_urlpatterns,
 ]
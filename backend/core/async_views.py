@@ -0,0 +1,50 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import HttpResponse
+
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+def run_in_thread_pool(view):
+    """
+    Асинхронная обертка над синхронным представлением для ASGI.
+
+    Под ASGI Django выполняет синхронные представления по очереди в одном
+    потоке. Здесь чтение (GET, HEAD) уходит в общий пул потоков
+    (thread_sensitive=False), поэтому медленный запрос не задерживает
+    остальные. Соединения с БД у потоков пула свои, их закрываем сами,
+    как это делает WSGI-обработчик по сигналам запроса. Запись выполняется
+    так же, как без обертки, — в общем потоке синхронных представлений.
+    """
+
+    def run(request, *args, **kwargs):
+        close_old_connections()
+        try:
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+            if response.streaming:
+                # Django 3.2 читает потоковый ответ в цикле событий,
+                # где запросы к БД запрещены, — собираем тело здесь.
+                streaming = response
+                response = HttpResponse(b''.join(streaming),
+                                        status=streaming.status_code)
+                for header, value in streaming.items():
+                    response[header] = value
+            return response
+        finally:
+            close_old_connections()
+
+    run = sync_to_async(run, thread_sensitive=False)
+    write = sync_to_async(view, thread_sensitive=True)
+
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        if request.method in READ_METHODS:
+            return await run(request, *args, **kwargs)
+        return await write(request, *args, **kwargs)
+
+    return async_view
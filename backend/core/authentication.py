@@ -0,0 +1,99 @@
+from collections import OrderedDict
+from copy import copy
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .cache import bump_cache_version, get_cache_version, is_cache_shared
+
+
+def get_auth_cache_name(user_id):
+    return f'auth:user:{user_id}'
+
+
+def invalidate_user_tokens(user_id):
+    """
+    Сбрасывает закэшированные токены пользователя во всех процессах:
+    версия хранится в общем кэше и сверяется при каждом запросе.
+    """
+    bump_cache_version(get_auth_cache_name(user_id))
+
+
+class TokenCache:
+    """Ограниченный по размеру LRU-кэш токенов с временем жизни записей."""
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1:]
+
+    def set(self, key, token, version):
+        with self.lock:
+            self.entries[key] = (monotonic() + self.timeout, token, version)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+token_cache = TokenCache(
+    settings.AUTH_TOKEN_CACHE_SIZE, settings.AUTH_TOKEN_CACHE_TIMEOUT
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication, который хранит токен с пользователем в памяти
+    процесса. Вместо соединения Token и User на каждый запрос — одно
+    чтение версии пользователя из кэша Django. Выход, смена пароля,
+    изменение и удаление пользователя меняют версию (см. users.signals).
+
+    Версия хранится в кэше Django, поэтому кэш токенов включается только
+    с общим для процессов кэшем: иначе выход или смена пароля в другом
+    процессе не сбросили бы запись здесь.
+    """
+
+    def authenticate_credentials(self, key):
+        if not is_cache_shared():
+            return super().authenticate_credentials(key)
+        entry = token_cache.get(key)
+        if entry is not None:
+            token, version = entry
+            if get_cache_version(
+                get_auth_cache_name(token.user_id)
+            ) == version:
+                return copy(token.user), token
+            token_cache.delete(key)
+        # Версия читается до загрузки пользователя: изменение, закоммиченное
+        # после загрузки, сменит версию, и запись не будет использована.
+        user_id = Token.objects.filter(key=key).values_list(
+            'user_id', flat=True
+        ).first()
+        if user_id is None:
+            return super().authenticate_credentials(key)
+        version = get_cache_version(get_auth_cache_name(user_id))
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, token, version)
+        return copy(user), token
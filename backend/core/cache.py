@@ -0,0 +1,38 @@
+from time import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+PROCESS_LOCAL_BACKENDS = (DummyCache, LocMemCache)
+
+
+def is_cache_shared():
+    """
+    Общий ли кэш для всех процессов сервера и команд manage.py.
+    Версии в LocMemCache видит только свой процесс: сброс версии из другого
+    процесса до него не дойдет, поэтому кэши поверх версий с таким
+    бэкендом выключаются.
+    """
+    return not isinstance(caches['default'], PROCESS_LOCAL_BACKENDS)
+
+
+def get_version_key(name):
+    return f'{name}:version'
+
+
+def get_cache_version(name):
+    """
+    Версия закэшированных данных: время последнего изменения.
+    Если версия вытеснена из кэша, считается, что данные изменились сейчас.
+    """
+    key = get_version_key(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_cache_version(name):
+    cache.set(get_version_key(name), time(), timeout=None)
@@ -4,4 +4,26 @@ MAX_RECIPE_VALUE_LENGTH = 200
 MAX_TAG_COLOR_LENGTH = 7
 TAG_COLOR_REGEX = r'^#([0-9a-fA-F]{3}){1,2}\Z'
 NAME_REGEX = r'^[A-Za-zа-яА-Я ]+$'
-SHOPPING_CART_FILENAME = 'shopping-list.txt'
+SHOPPING_CART_FILENAME = 'shopping-list'
+SHOPPING_CART_CHUNK_SIZE = 500
+LIST_CACHE_TIMEOUT = 60 * 60 * 24
+TAGS_CACHE_NAME = 'tags'
+INGREDIENTS_CACHE_NAME = 'ingredients'
+RECIPES_CACHE_NAME = 'recipes'
+RECIPE_IMAGE_RENDITIONS = {
+    'card': (480, 480),
+    'detail': (1200, 1200),
+}
+RENDITIONS_DIR = 'recipes/renditions'
+MAX_BATCH_RECIPES = 100
+SHORT_RECIPE_FIELDS = (
+    'id', 'name', 'image', 'image_renditions_ready', 'cooking_time',
+)
+
+SEARCH_CONFIG = 'russian'
+
+FEED_FANOUT_MAX_FOLLOWERS = 1000
+FEED_JOIN_MAX_SUBSCRIPTIONS = 50
+FEED_BACKFILL_RECIPES = 100
+FEED_REQUEST_BACKFILL_RECIPES = 6
+FEED_BATCH_SIZE = 1000
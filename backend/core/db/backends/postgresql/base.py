@@ -0,0 +1,80 @@
+from functools import partial
+
+from django.db.backends.postgresql import base
+
+from .pool import get_pool
+
+DEFAULT_POOL_TIMEOUT = 10
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL с проверкой переиспользуемых соединений и необязательным
+    пулом соединений.
+
+    CONN_HEALTH_CHECKS работает как в Django 4.1: постоянное соединение
+    (CONN_MAX_AGE > 0) проверяется SELECT 1 перед первым запросом
+    в очередном HTTP-запросе и переоткрывается, если сервер его закрыл.
+
+    OPTIONS['pool'] = {'max_size': ..., 'timeout': ...} включает пул:
+    соединение берется из пула при первом запросе к БД и возвращается
+    туда вместо закрытия.
+    """
+    health_check_done = False
+    pool = None
+
+    @property
+    def health_check_enabled(self):
+        return self.settings_dict.get('CONN_HEALTH_CHECKS', False)
+
+    @property
+    def pool_options(self):
+        return self.settings_dict['OPTIONS'].get('pool')
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop('pool', None)
+        return conn_params
+
+    def get_new_connection(self, conn_params):
+        if not self.pool_options:
+            return super().get_new_connection(conn_params)
+        self.pool = get_pool(
+            (self.alias, repr(sorted(conn_params.items()))),
+            max_size=self.pool_options['max_size'],
+            timeout=self.pool_options.get('timeout', DEFAULT_POOL_TIMEOUT),
+            health_checks=self.health_check_enabled,
+        )
+        return self.pool.acquire(
+            partial(super().get_new_connection, conn_params)
+        )
+
+    def connect(self):
+        super().connect()
+        self.health_check_done = True
+
+    def _close(self):
+        if self.connection is not None and self.pool is not None:
+            self.pool.release(self.connection)
+            return
+        super()._close()
+
+    def close_if_unusable_or_obsolete(self):
+        if self.connection is not None:
+            self.health_check_done = False
+        super().close_if_unusable_or_obsolete()
+
+    def close_if_health_check_failed(self):
+        if (
+            self.connection is None
+            or not self.health_check_enabled
+            or self.health_check_done
+        ):
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
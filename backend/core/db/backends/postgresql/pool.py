@@ -0,0 +1,123 @@
+import threading
+from collections import deque
+from time import monotonic
+
+from psycopg2 import Error, OperationalError
+from psycopg2.extensions import (TRANSACTION_STATUS_IDLE,
+                                 TRANSACTION_STATUS_UNKNOWN)
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """
+    Пул соединений psycopg2 внутри процесса: не больше max_size открытых
+    соединений, остальные потоки ждут свободное не дольше timeout секунд.
+    """
+
+    def __init__(self, max_size, timeout, health_checks):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_checks = health_checks
+        self.idle = deque()
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.lock = threading.Lock()
+        self.stats = dict.fromkeys(
+            ('opened', 'discarded', 'acquired', 'in_use', 'waited',
+             'timeouts'),
+            0,
+        )
+        self.stats['wait_time'] = 0.0
+
+    def count(self, **deltas):
+        with self.lock:
+            for name, delta in deltas.items():
+                self.stats[name] += delta
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                **self.stats,
+                'idle': len(self.idle),
+                'max_size': self.max_size,
+            }
+
+    def acquire(self, connect):
+        started = monotonic()
+        if not self.slots.acquire(blocking=False):
+            self.count(waited=1)
+            if not self.slots.acquire(timeout=self.timeout):
+                self.count(timeouts=1)
+                raise OperationalError(
+                    f"Нет свободных соединений в пуле за {self.timeout} с "
+                    f"(max_size={self.max_size})."
+                )
+        self.count(acquired=1, in_use=1, wait_time=monotonic() - started)
+        try:
+            while self.idle:
+                try:
+                    connection = self.idle.pop()
+                except IndexError:
+                    break
+                if self.is_usable(connection):
+                    return connection
+                self.discard(connection)
+            connection = connect()
+            self.count(opened=1)
+            return connection
+        except BaseException:
+            self.count(in_use=-1)
+            self.slots.release()
+            raise
+
+    def release(self, connection):
+        try:
+            status = connection.get_transaction_status()
+            if connection.closed or status == TRANSACTION_STATUS_UNKNOWN:
+                self.discard(connection)
+                return
+            if status != TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+            self.idle.append(connection)
+        except Error:
+            self.discard(connection)
+        finally:
+            self.count(in_use=-1)
+            self.slots.release()
+
+    def is_usable(self, connection):
+        if connection.closed:
+            return False
+        if not self.health_checks:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except Error:
+            return False
+        return True
+
+    def discard(self, connection):
+        self.count(discarded=1)
+        try:
+            connection.close()
+        except Error:
+            pass
+
+
+def get_pool(key, max_size, timeout, health_checks):
+    """Пул для пары (псевдоним БД, параметры подключения)."""
+    with pools_lock:
+        if key not in pools:
+            pools[key] = ConnectionPool(max_size, timeout, health_checks)
+        return pools[key]
+
+
+def get_pool_stats():
+    """Статистика пулов по псевдонимам БД для метрик."""
+    stats = {}
+    with pools_lock:
+        for (alias, _), pool in pools.items():
+            stats.setdefault(alias, []).append(pool.get_stats())
+    return stats
@@ -0,0 +1,113 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections, models, router, transaction
+from django.dispatch import Signal
+
+# Каскадное удаление одним шагом.
+# Collector Django отправляет pre_delete и post_delete по каждой строке,
+# причем зависимым строкам раньше, чем самому удаляемому объекту, — так что
+# pre_delete рецепта или пользователя приходит слишком поздно. Поэтому
+# удаление моделей с CascadeDeleteMixin и CascadeDeleteQuerySet сначала
+# отмечает удаляемые объекты и отправляет cascade_delete: получатели
+# одним запросом на связь поправляют счетчики и суммы, а поштучные
+# получатели строк, удаляемых каскадом, проверяют in_cascade и ничего
+# не делают.
+
+cascade_delete = Signal()
+
+deleting = ContextVar('deleting', default=None)
+
+
+def get_deleting(model):
+    """Первичные ключи объектов model, удаляемых в текущем каскаде."""
+    return (deleting.get() or {}).get(model, frozenset())
+
+
+def mark_deleting(model, pks):
+    """Отмечает объекты, которые удалятся каскадом вместе с текущими."""
+    marked = deleting.get()
+    marked[model] = get_deleting(model) | frozenset(pks)
+
+
+def in_cascade(instance):
+    """
+    Удаляется ли строка вместе с отмеченным объектом: сама отмечена или
+    ссылается на отмеченный объект.
+    """
+    marked = deleting.get()
+    if not marked:
+        return False
+    if instance.pk in marked.get(type(instance), ()):
+        return True
+    return any(
+        getattr(instance, field.attname) in marked.get(
+            field.related_model, ()
+        )
+        for field in instance._meta.concrete_fields
+        if field.many_to_one
+    )
+
+
+@contextmanager
+def deleting_objects(model, pks):
+    with transaction.atomic(savepoint=False):
+        token = deleting.set(dict(deleting.get() or {}))
+        try:
+            mark_deleting(model, pks)
+            if pks:
+                cascade_delete.send(sender=model, pks=pks)
+            yield
+        finally:
+            deleting.reset(token)
+
+
+class CascadeDeleteQuerySet(models.QuerySet):
+    def delete(self):
+        pks = list(self.values_list('pk', flat=True))
+        with deleting_objects(self.model, pks):
+            return super().delete()
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+class CascadeDeleteMixin:
+    """Удаление объекта модели с отправкой cascade_delete."""
+
+    def delete(self, using=None, keep_parents=False):
+        with deleting_objects(type(self), [self.pk]):
+            return super().delete(using, keep_parents)
+
+
+def delete_returning(model, returning, **filters):
+    """
+    Один DELETE строк model по равенству полей (или вхождению в список),
+    без Collector и сигналов удаления. Возвращает значения поля returning
+    у действительно удаленных строк (RETURNING): по ним вызывающий код
+    сдвигает счетчики, даже если ту же строку параллельно удалил другой
+    запрос. RETURNING поддерживают PostgreSQL и SQLite с версии 3.35.
+    """
+    connection = connections[router.db_for_write(model)]
+    quote_name = connection.ops.quote_name
+    conditions, params = [], []
+    for name, value in filters.items():
+        column = quote_name(model._meta.get_field(name).column)
+        if isinstance(value, (list, tuple, set, frozenset)):
+            if not value:
+                return []
+            conditions.append(
+                f"{column} IN ({', '.join(['%s'] * len(value))})"
+            )
+            params.extend(value)
+        else:
+            conditions.append(f'{column} = %s')
+            params.append(value)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote_name(model._meta.db_table)} '
+            f"WHERE {' AND '.join(conditions)} "
+            f'RETURNING {quote_name(model._meta.get_field(returning).column)}',
+            params,
+        )
+        return [value for value, in cursor.fetchall()]
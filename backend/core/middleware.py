@@ -0,0 +1,160 @@
+import logging
+import random
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+current_timing = ContextVar('current_timing', default=None)
+
+
+class RequestTiming:
+    __slots__ = ('started', 'view_started', 'queries', 'db_time', 'view')
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.view_started = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.view = None
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Обертка выполнения SQL (connection.execute_wrapper) для всех
+    соединений. Учитывает запрос, только если текущий HTTP-запрос попал
+    в выборку; контекстная переменная переходит и в потоки sync_to_async.
+    """
+    timing = current_timing.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.db_time += perf_counter() - started
+        timing.queries += 1
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def get_view_name(view_func, method):
+    """Имя вида RecipeViewSet.list для представлений DRF."""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{view_class.__name__}.{actions.get(method, method)}'
+
+
+class RequestTimingMiddleware:
+    """
+    Для доли запросов REQUEST_TIMING_SAMPLE_RATE считает число SQL-запросов,
+    время в БД, время в представлении без БД (для DRF это в основном
+    сериализация и рендеринг) и общее время. Отдает их в заголовке
+    Server-Timing и пишет в лог запросы, превысившие
+    REQUEST_TIMING_SLOW_MS или REQUEST_TIMING_SLOW_QUERIES. В тестах лог
+    выключен (LOGGING в settings).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = settings.REQUEST_TIMING_SAMPLE_RATE
+        self.slow_ms = settings.REQUEST_TIMING_SLOW_MS
+        self.slow_queries = settings.REQUEST_TIMING_SLOW_QUERIES
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+        timing = RequestTiming()
+        token = current_timing.set(timing)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timing.reset(token)
+        return self.finish(request, response, timing)
+
+    async def __acall__(self, request):
+        if random.random() >= self.sample_rate:
+            return await self.get_response(request)
+        timing = RequestTiming()
+        token = current_timing.set(timing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timing.reset(token)
+        return self.finish(request, response, timing)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timing = current_timing.get()
+        if timing is not None:
+            timing.view_started = perf_counter()
+            timing.view = get_view_name(view_func, request.method.lower())
+
+    def finish(self, request, response, timing):
+        """
+        Server-Timing уходит с заголовками, до тела ответа, поэтому для
+        StreamingHttpResponse в нем только время до начала потока. Запросы
+        при чтении потока учитываются в логе: он пишется, когда поток
+        прочитан.
+        """
+        total_ms, db_ms, view_ms = self.get_durations(timing)
+        response['Server-Timing'] = (
+            f'db;dur={db_ms:.1f};desc="{timing.queries} queries", '
+            f'serialize;dur={view_ms:.1f}, '
+            f'total;dur={total_ms:.1f}'
+        )
+        if response.streaming:
+            response.streaming_content = self.iter_streaming(
+                request, response.streaming_content, timing
+            )
+        else:
+            self.log_slow(request, timing)
+        return response
+
+    def iter_streaming(self, request, content, timing):
+        # Переменная ставится на каждый кусок отдельно: между кусками
+        # поток могут читать в другом контексте.
+        content = iter(content)
+        while True:
+            token = current_timing.set(timing)
+            try:
+                chunk = next(content)
+            except StopIteration:
+                break
+            finally:
+                current_timing.reset(token)
+            yield chunk
+        self.log_slow(request, timing)
+
+    def get_durations(self, timing):
+        total_ms = (perf_counter() - timing.started) * 1000
+        db_ms = timing.db_time * 1000
+        view_ms = 0.0
+        if timing.view_started is not None:
+            view_ms = max(
+                (perf_counter() - timing.view_started) * 1000 - db_ms, 0.0
+            )
+        return total_ms, db_ms, view_ms
+
+    def log_slow(self, request, timing):
+        total_ms, db_ms, view_ms = self.get_durations(timing)
+        if total_ms >= self.slow_ms or timing.queries >= self.slow_queries:
+            logger.warning(
+                "Медленный запрос %s %s %s: %.0f мс, БД %.0f мс "
+                "(%d запросов), сериализация %.0f мс",
+                timing.view, request.method, request.get_full_path(),
+                total_ms, db_ms, timing.queries, view_ms,
+            )
@@ -0,0 +1,106 @@
+import hashlib
+from urllib.parse import parse_qs, urlsplit
+
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .cache import get_cache_version, is_cache_shared
+from .constants import LIST_CACHE_TIMEOUT
+
+
+class CachedListMixin:
+    """
+    Кэширует данные ответа list и отвечает 304 на условные запросы.
+    Кэш сбрасывается сменой версии cache_name, поэтому работает только
+    с общим для процессов кэшем (см. core.cache.is_cache_shared).
+    Ссылки next и previous строятся заново от адреса каждого запроса.
+    """
+    cache_name = None
+
+    def get_list_data(self, request):
+        return super().list(request).data
+
+    def get_list_cache_key(self, request):
+        return request.get_full_path()
+
+    def is_list_cacheable(self, request):
+        return is_cache_shared() and isinstance(
+            request.accepted_renderer, JSONRenderer
+        )
+
+    def get_page_links(self, request, data):
+        """
+        Ссылки на соседние страницы от адреса этого запроса: в кэше могут
+        лежать ссылки с хостом и параметрами запроса, который его заполнил.
+        """
+        names = [
+            getattr(self.paginator, name) for name in
+            ('page_query_param', 'cursor_query_param')
+            if hasattr(self.paginator, name)
+        ]
+        url = request.build_absolute_uri()
+        links = {}
+        for key in ('next', 'previous'):
+            link = data[key]
+            if link is not None:
+                params = parse_qs(urlsplit(link).query)
+                link = url
+                for name in names:
+                    if name in params:
+                        link = replace_query_param(
+                            link, name, params[name][0]
+                        )
+                    else:
+                        link = remove_query_param(link, name)
+            links[key] = link
+        return links
+
+    def list(self, request, *args, **kwargs):
+        if not self.is_list_cacheable(request):
+            return Response(self.get_list_data(request))
+
+        version = get_cache_version(self.cache_name)
+        path = self.get_list_cache_key(request)
+        etag = '"{}"'.format(hashlib.md5(
+            f'{self.cache_name}:{version}:{path}'.encode()
+        ).hexdigest())
+        last_modified = int(version)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            cache_key = f'{self.cache_name}:{version}:{path}'
+            data = cache.get(cache_key)
+            if data is None:
+                data = self.get_list_data(request)
+                cache.set(cache_key, data, LIST_CACHE_TIMEOUT)
+            if isinstance(data, dict) and 'next' in data:
+                data = {**data, **self.get_page_links(request, data)}
+            response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+class OptionalCursorPaginationMixin:
+    """
+    Переключает пагинацию на cursor_pagination_class, если в запросе
+    передан параметр курсора. По умолчанию остается page/limit.
+    """
+    cursor_pagination_class = None
+
+    def use_cursor_pagination(self):
+        return self.cursor_pagination_class is not None and (
+            self.cursor_pagination_class.cursor_query_param
+            in self.request.query_params
+        )
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator') and self.use_cursor_pagination():
+            self._paginator = self.cursor_pagination_class()
+        return super().paginator
@@ -0,0 +1,11 @@
+from rest_framework.negotiation import DefaultContentNegotiation
+
+
+class IgnoreFormatContentNegotiation(DefaultContentNegotiation):
+    """
+    Выбор рендерера без учета параметра ?format=.
+    Нужен для эндпоинтов, которые сами обрабатывают этот параметр.
+    """
+
+    def filter_renderers(self, renderers, format):
+        return renderers
@@ -1,5 +1,37 @@
-from rest_framework.pagination import PageNumberPagination
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class PkCountPaginator(Paginator):
+    """
+    Считает строки по первичному ключу, не вычисляя аннотации выборки
+    (например, EXISTS-флаги избранного и списка покупок).
+    """
+
+    @cached_property
+    def count(self):
+        if hasattr(self.object_list, 'values'):
+            return self.object_list.values('pk').count()
+        return super().count
 
 
 class LimitPageNumberPagination(PageNumberPagination):
+    django_paginator_class = PkCountPaginator
+    page_size_query_param = 'limit'
+
+
+class LimitCursorPagination(CursorPagination):
+    """
+    Курсорная пагинация без COUNT и OFFSET.
+    Включается параметром ?cursor= (пустое значение — первая страница).
+    """
     page_size_query_param = 'limit'
+
+
+class RecipeCursorPagination(LimitCursorPagination):
+    ordering = ('-pub_date', '-id')
+
+
+class UserCursorPagination(LimitCursorPagination):
+    ordering = ('-username',)
@@ -0,0 +1,168 @@
+import re
+import shutil
+import tempfile
+from threading import current_thread
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from users.models import User
+from .async_views import run_in_thread_pool
+from .authentication import token_cache
+from .middleware import logger
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Закэшированный токен перестает действовать после изменений."""
+
+    @classmethod
+    def setUpClass(cls):
+        cache_dir = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        overridden = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': cache_dir,
+        }})
+        overridden.enable()
+        cls.addClassCleanup(overridden.disable)
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='cached', email='cached@foodgram.ru',
+            first_name='Токен', last_name='Кэш', password='Cached-token-1',
+        )
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_is_cached(self):
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/users/me/')
+        self.assertEqual(response.data['email'], self.user.email)
+
+    def test_logout(self):
+        self.client.get('/api/users/me/')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_deactivation(self):
+        self.client.get('/api/users/me/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_profile_change(self):
+        self.client.get('/api/users/me/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = 'Новое'
+            self.user.save()
+        response = self.client.get('/api/users/me/')
+        self.assertEqual(response.data['first_name'], 'Новое')
+
+
+class RequestTimingMiddlewareTests(TestCase):
+    """Server-Timing и лог медленных запросов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='timing', email='timing@foodgram.ru',
+            first_name='Время', last_name='Запроса', password='Timing-1',
+        )
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def get_timing_queries(self, response):
+        return int(re.search(
+            r'db;dur=[\d.]+;desc="(\d+) queries"', response['Server-Timing']
+        ).group(1))
+
+    def test_server_timing(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.get_timing_queries(response), len(captured.captured_queries)
+        )
+        self.assertRegex(
+            response['Server-Timing'], r'serialize;dur=[\d.]+, total;dur='
+        )
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=0)
+    def test_not_sampled(self):
+        response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(REQUEST_TIMING_SLOW_QUERIES=1)
+    def test_slow_request_logged(self):
+        with self.assertLogs(logger, 'WARNING') as logs:
+            self.client.get('/api/users/me/')
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('UserViewSet.me GET /api/users/me/',
+                      logs.output[0])
+
+    def test_fast_request_not_logged(self):
+        with mock.patch.object(logger, 'warning') as warning:
+            self.client.get('/api/users/me/')
+        warning.assert_not_called()
+
+    @override_settings(REQUEST_TIMING_SLOW_QUERIES=1)
+    def test_streaming_queries_counted(self):
+        with mock.patch.object(logger, 'warning') as warning:
+            response = self.client.get(
+                '/api/recipes/download_shopping_cart/'
+            )
+            self.assertTrue(response.streaming)
+            header_queries = self.get_timing_queries(response)
+            warning.assert_not_called()
+            with CaptureQueriesContext(connection) as captured:
+                b''.join(response.streaming_content)
+        warning.assert_called_once()
+        self.assertEqual(
+            warning.call_args.args[6],
+            header_queries + len(captured.captured_queries),
+        )
+        self.assertGreater(len(captured.captured_queries), 0)
+
+
+class RunInThreadPoolTests(SimpleTestCase):
+    """В пул потоков уходит только чтение, запись — в общий поток."""
+
+    def test_methods(self):
+        threads = {}
+
+        def view(request):
+            threads[request.method] = current_thread()
+            return HttpResponse()
+
+        async_view = async_to_sync(run_in_thread_pool(view))
+        factory = RequestFactory()
+        for method in ('get', 'head', 'post', 'put', 'patch', 'delete'):
+            response = async_view(getattr(factory, method)('/'))
+            self.assertEqual(response.status_code, 200)
+        for method, thread in threads.items():
+            with self.subTest(method=method):
+                if method in ('GET', 'HEAD'):
+                    self.assertIsNot(thread, current_thread())
+                else:
+                    self.assertIs(thread, current_thread())
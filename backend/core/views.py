@@ -0,0 +1,12 @@
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from .db.backends.postgresql.pool import get_pool_stats
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def db_pool_stats(request):
+    """Статистика пулов соединений с БД этого процесса."""
+    return Response(get_pool_stats())
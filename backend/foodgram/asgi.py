@@ -0,0 +1,37 @@
+"""
+ASGI config for foodgram project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Requests are resolved with ``foodgram.asgi_urls``, where the read-heavy API
+endpoints are async views.
+
+The Docker image runs the WSGI application: Django 3.2 cannot stream
+a response under ASGI, so the shopping list would be built in memory.
+Start gunicorn with ``--worker-class uvicorn.workers.UvicornWorker
+foodgram.asgi`` to serve the API over ASGI instead.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
+"""
+
+import os
+
+import django
+from django.core.handlers.asgi import ASGIHandler
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+
+django.setup(set_prefix=False)
+
+
+class FoodgramASGIHandler(ASGIHandler):
+    urlconf = 'foodgram.asgi_urls'
+
+    def create_request(self, scope, body_file):
+        request, error_response = super().create_request(scope, body_file)
+        if request is not None:
+            request.urlconf = self.urlconf
+        return request, error_response
+
+
+application = FoodgramASGIHandler()
@@ -0,0 +1,10 @@
+"""URL-схема для ASGI: та же, что в foodgram.urls, но API-чтение
+выполняется асинхронными обертками из api.asgi_urls."""
+from django.urls import include, path
+
+from .urls import urlpatterns as wsgi_urlpatterns
+
+urlpatterns = [
+    path('api/', include('api.asgi_urls')),
+    *(url for url in wsgi_urlpatterns if str(url.pattern) != 'api/'),
+]
@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -27,6 +28,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,12 +60,41 @@ WSGI_APPLICATION = 'foodgram.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
+        'ENGINE': 'django.db.backends.postgresql',
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
         'PORT': os.getenv('DB_PORT', 5432),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': (
+            os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True'
+        ),
+        'OPTIONS': {},
+    }
+}
+
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 0))
+
+if DB_POOL_MAX_SIZE:
+    # С пулом соединение возвращается в пул в конце каждого запроса.
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'max_size': DB_POOL_MAX_SIZE,
+        'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+    }
+
+if DB_POOL_MAX_SIZE or DATABASES['default']['CONN_MAX_AGE']:
+    # Пул и проверка постоянных соединений есть только в своем бэкенде;
+    # без них остается стандартный бэкенд Django.
+    DATABASES['default']['ENGINE'] = 'core.db.backends.postgresql'
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     }
 }
 
@@ -98,9 +129,28 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/backend_media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+IMAGE_RENDITION_WORKERS = int(os.getenv('IMAGE_RENDITION_WORKERS', 2))
+
+REQUEST_TIMING_SAMPLE_RATE = float(os.getenv('REQUEST_TIMING_SAMPLE_RATE', 1))
+REQUEST_TIMING_SLOW_MS = float(os.getenv('REQUEST_TIMING_SLOW_MS', 500))
+REQUEST_TIMING_SLOW_QUERIES = int(os.getenv('REQUEST_TIMING_SLOW_QUERIES', 20))
+
+if sys.argv[1:2] == ['test']:
+    # Тесты намеренно шлют тяжелые запросы: медленные запросы не в лог.
+    LOGGING = {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'loggers': {'core.middleware': {'level': 'ERROR'}},
+    }
+
+RECIPE_FAST_READ = os.getenv('RECIPE_FAST_READ', 'False') == 'True'
+
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 10_000))
+AUTH_TOKEN_CACHE_TIMEOUT = float(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', 300))
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'core.authentication.CachedTokenAuthentication',
     ],
 
     'DEFAULT_PAGINATION_CLASS': 'core.pagination.LimitPageNumberPagination',
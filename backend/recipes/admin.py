@@ -1,7 +1,8 @@
 from django.contrib import admin
 
-from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                     ShoppingCart, Tag)
+from .models import (CartIngredient, Favorite, Ingredient, Recipe,
+                     RecipeIngredient, ShoppingCart, Tag)
+from .shopping_cart import rebuild_carts
 
 
 class RecipeIngredientInline(admin.TabularInline):
@@ -10,8 +11,27 @@ class RecipeIngredientInline(admin.TabularInline):
     min_num = 1
 
 
+class RebuildCartsMixin:
+    """
+    Правка состава рецептов в админке пересчитывает суммы списков
+    покупок, которые она затрагивает. cart_lookups — пары (модель,
+    путь к редактируемому объекту), по которым находятся эти списки.
+    """
+    cart_lookups = ()
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if any(formset.has_changed() for formset in formsets):
+            user_ids = set()
+            for model, lookup in self.cart_lookups:
+                user_ids.update(model.objects.filter(
+                    **{lookup: form.instance}
+                ).values_list('user_id', flat=True))
+            rebuild_carts(sorted(user_ids))
+
+
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(RebuildCartsMixin, admin.ModelAdmin):
     list_display = (
         'pk',
         'name',
@@ -19,17 +39,16 @@ class RecipeAdmin(admin.ModelAdmin):
         'ingredients_list',
         'author',
         'pub_date',
-        'favorite_count',
+        'favorites_count',
+        'in_carts_count',
     )
     list_editable = ('name',)
     list_filter = ('name', 'tags', 'author',)
     search_fields = ('name', 'author__username',)
     inlines = (RecipeIngredientInline,)
-    readonly_fields = ('favorite_count', 'ingredients_list',)
-
-    @admin.display(description='добавления рецепта в избранное')
-    def favorite_count(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
+    cart_lookups = ((ShoppingCart, 'recipe'),)
+    readonly_fields = ('favorites_count', 'in_carts_count',
+                       'ingredients_list',)
 
     @admin.display(description='ингредиенты рецепта')
     def ingredients_list(self, recipe):
@@ -52,7 +71,7 @@ class TagAdmin(admin.ModelAdmin):
 
 
 @admin.register(Ingredient)
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(RebuildCartsMixin, admin.ModelAdmin):
     list_display = (
         'pk',
         'name',
@@ -62,6 +81,11 @@ class IngredientAdmin(admin.ModelAdmin):
     list_filter = ('name',)
     search_fields = ('name',)
     inlines = (RecipeIngredientInline,)
+    cart_lookups = (
+        (ShoppingCart, 'recipe__ingredients__ingredient'),
+        # Строки, которые правка убрала из рецептов.
+        (CartIngredient, 'ingredient'),
+    )
 
 
 @admin.register(Favorite)
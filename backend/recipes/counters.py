@@ -0,0 +1,62 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from core.deletion import get_deleting
+from users.models import Subscribe, User
+from .models import Favorite, Recipe, ShoppingCart
+
+# Счетчик: (модель со счетчиком, поле счетчика, считаемая модель, связь).
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscribe, 'subscribing'),
+)
+
+
+def count_subquery(counted_model, relation):
+    return Coalesce(
+        Subquery(
+            counted_model.objects.filter(
+                **{relation: OuterRef('pk')}
+            ).order_by().values(relation).annotate(
+                count=Count('pk')
+            ).values('count')
+        ),
+        0,
+    )
+
+
+def change_counters(counted_model, pks, delta):
+    """
+    Сдвигает на delta счетчики строк counted_model у объектов с
+    первичными ключами pks (рецептов или авторов) одним UPDATE.
+    """
+    for model, field, model_counted, _ in COUNTERS:
+        if model_counted is not counted_model:
+            continue
+        counters = model.objects.filter(pk__in=pks)
+        if delta < 0:
+            counters = counters.filter(**{f'{field}__gt': 0})
+        counters.update(**{field: F(field) + delta})
+
+
+def remove_counted(counted_model, rows):
+    """
+    Вычитает из счетчиков строки rows (выборка counted_model), которые
+    удаляются каскадом, — одним UPDATE на счетчик вместо сигнала на строку.
+    Счетчики объектов, удаляемых в том же каскаде, не меняются.
+    """
+    for model, field, model_counted, relation in COUNTERS:
+        if model_counted is not counted_model:
+            continue
+        counts = rows.filter(
+            **{relation: OuterRef('pk')}
+        ).order_by().values(relation).annotate(
+            count=Count('pk')
+        ).values('count')
+        model.objects.filter(
+            pk__in=rows.values(relation)
+        ).exclude(
+            pk__in=get_deleting(model)
+        ).update(**{field: Greatest(F(field) - Subquery(counts), 0)})
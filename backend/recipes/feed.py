@@ -0,0 +1,136 @@
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from core.constants import (FEED_BACKFILL_RECIPES, FEED_BATCH_SIZE,
+                            FEED_FANOUT_MAX_FOLLOWERS,
+                            FEED_JOIN_MAX_SUBSCRIPTIONS,
+                            FEED_REQUEST_BACKFILL_RECIPES)
+from users.models import Subscribe, User
+from .models import FeedEntry, Recipe
+
+# Лента собирается двумя способами.
+# Запись: новый рецепт раскладывается по FeedEntry всех подписчиков
+# автора, если подписчиков не больше FEED_FANOUT_MAX_FOLLOWERS.
+# Рецепты более популярных авторов в FeedEntry не пишутся и
+# подтягиваются при чтении.
+# Чтение: при небольшом числе подписок лента — индексированный JOIN
+# рецептов подписок (индекс author, -pub_date, -id), иначе — FeedEntry
+# плюс рецепты популярных авторов.
+# Когда популярный автор после отписок снова раскладывается по лентам,
+# в запросе дописываются только FEED_REQUEST_BACKFILL_RECIPES его
+# последних рецептов во все ленты подписчиков; остальное дописывает
+# команда rebuild_feeds.
+
+
+def count_followers(author_id):
+    return Subscribe.objects.filter(subscribing_id=author_id).count()
+
+
+def add_entries(user_ids, author_id, recipe_ids):
+    entries = (
+        FeedEntry(user_id=user_id, recipe_id=recipe_id, author_id=author_id)
+        for user_id in user_ids
+        for recipe_id in recipe_ids
+    )
+    while batch := list(islice(entries, FEED_BATCH_SIZE)):
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+@transaction.atomic(savepoint=False)
+def fan_out(recipe):
+    """
+    Добавляет новый рецепт в ленты подписчиков автора, если автор не
+    популярный. Число подписчиков читается из БД под блокировкой строки
+    автора: recipe.author может быть устаревшей копией, а параллельная
+    подписка или отписка ждет конца транзакции и видит новый рецепт.
+    """
+    followers_count = User.objects.select_for_update().filter(
+        pk=recipe.author_id
+    ).values_list('followers_count', flat=True).get()
+    if followers_count > FEED_FANOUT_MAX_FOLLOWERS:
+        return
+    follower_ids = Subscribe.objects.filter(
+        subscribing_id=recipe.author_id
+    ).values_list('user_id', flat=True)
+    add_entries(follower_ids.iterator(), recipe.author_id, [recipe.pk])
+
+
+def backfill(user_ids, author_id, recipes=FEED_BACKFILL_RECIPES):
+    """Добавляет в ленты recipes последних рецептов автора."""
+    recipe_ids = list(Recipe.objects.filter(
+        author_id=author_id
+    ).order_by('-pub_date', '-id').values_list(
+        'id', flat=True
+    )[:recipes])
+    add_entries(user_ids, author_id, recipe_ids)
+
+
+def on_subscribe(user_id, author_id):
+    if count_followers(author_id) <= FEED_FANOUT_MAX_FOLLOWERS:
+        backfill([user_id], author_id)
+
+
+def on_unsubscribe(user_id, author_id):
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+    if count_followers(author_id) == FEED_FANOUT_MAX_FOLLOWERS:
+        # Автор снова раскладывается по лентам: дописываем последние
+        # рецепты, опубликованные, пока он был популярным.
+        backfill(
+            Subscribe.objects.filter(
+                subscribing_id=author_id
+            ).values_list('user_id', flat=True),
+            author_id,
+            FEED_REQUEST_BACKFILL_RECIPES,
+        )
+
+
+def get_popular_authors(author_ids):
+    """Авторы, рецепты которых не раскладываются по лентам."""
+    return list(User.objects.filter(
+        pk__in=author_ids,
+        followers_count__gt=FEED_FANOUT_MAX_FOLLOWERS,
+    ).values_list('pk', flat=True))
+
+
+def backfill_unpopular(author_ids, exclude_user_ids=(),
+                       recipes=FEED_REQUEST_BACKFILL_RECIPES):
+    """
+    Дописывает рецепты бывших популярных авторов, которые после отписок
+    снова раскладываются по лентам, — как on_unsubscribe, но для многих
+    отписок разом (удаление пользователей) или для всех авторов
+    (rebuild_feeds).
+    """
+    for author_id in User.objects.filter(
+        pk__in=author_ids,
+        followers_count__lte=FEED_FANOUT_MAX_FOLLOWERS,
+    ).values_list('pk', flat=True):
+        backfill(
+            Subscribe.objects.filter(
+                subscribing_id=author_id
+            ).exclude(
+                user_id__in=exclude_user_ids
+            ).values_list('user_id', flat=True),
+            author_id,
+            recipes,
+        )
+
+
+def get_feed(queryset, user):
+    """Рецепты авторов, на которых подписан user."""
+    subscriptions = Subscribe.objects.filter(user=user)
+    few_subscriptions = subscriptions[
+        :FEED_JOIN_MAX_SUBSCRIPTIONS + 1
+    ].count() <= FEED_JOIN_MAX_SUBSCRIPTIONS
+    if few_subscriptions:
+        return queryset.filter(
+            author__in=subscriptions.values('subscribing')
+        )
+    popular = subscriptions.filter(
+        subscribing__followers_count__gt=FEED_FANOUT_MAX_FOLLOWERS
+    )
+    return queryset.filter(
+        Q(Exists(FeedEntry.objects.filter(user=user, recipe=OuterRef('pk'))))
+        | Q(author__in=popular.values('subscribing'))
+    )
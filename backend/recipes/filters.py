@@ -1,18 +1,39 @@
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+from django.utils.functional import cached_property
 from django_filters import rest_framework as django_filters
-from rest_framework import filters
 
-from .models import Recipe, Tag
+from core.cache import get_cache_version, is_cache_shared
+from core.constants import LIST_CACHE_TIMEOUT, TAGS_CACHE_NAME
+from .models import Favorite, Recipe, ShoppingCart, Tag
+from .search import search_recipes
 
+TAGS_MODE_ANY = 'any'
+TAGS_MODE_ALL = 'all'
 
-class IngredientSearchFilter(filters.SearchFilter):
-    search_param = 'name'
+
+def get_tag_ids_by_slug():
+    """
+    Словарь slug -> id тегов из кэша, без обращения к БД.
+    С кэшем в памяти процесса словарь читается из БД.
+    """
+    if not is_cache_shared():
+        return dict(Tag.objects.values_list('slug', 'id'))
+    version = get_cache_version(TAGS_CACHE_NAME)
+    key = f'{TAGS_CACHE_NAME}:{version}:slugs'
+    tag_ids = cache.get(key)
+    if tag_ids is None:
+        tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(key, tag_ids, LIST_CACHE_TIMEOUT)
+    return tag_ids
 
 
 class RecipeFilter(django_filters.FilterSet):
-    tags = django_filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
+    tags = django_filters.MultipleChoiceFilter(method='filter_tags')
+    tags_mode = django_filters.ChoiceFilter(
+        choices=((TAGS_MODE_ANY, TAGS_MODE_ANY),
+                 (TAGS_MODE_ALL, TAGS_MODE_ALL)),
+        method='filter_tags_mode',
     )
     is_favorited = django_filters.BooleanFilter(
         method='filter_is_favorited',
@@ -20,25 +41,75 @@ class RecipeFilter(django_filters.FilterSet):
     is_in_shopping_cart = django_filters.BooleanFilter(
         method='filter_is_in_shopping_cart',
     )
+    search = django_filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart',)
+        fields = ('author', 'tags', 'tags_mode', 'is_favorited',
+                  'is_in_shopping_cart', 'search',)
 
-    def filter_is_favorited(self, queryset, name, value):
-        if value and self.request.user.is_authenticated:
-            recipe_ids = list(self.request.user.favorited_by.values_list(
-                'recipe_id', flat=True
-            ))
-            return queryset.filter(id__in=recipe_ids)
+    @property
+    def form(self):
+        if not hasattr(self, '_form'):
+            super().form.fields['tags'].choices = self.get_tag_choices
+        return self._form
+
+    @cached_property
+    def tag_ids_by_slug(self):
+        """
+        Словарь тегов читается один раз на запрос и только если теги
+        переданы: и для проверки slug в форме, и для фильтрации.
+        """
+        return get_tag_ids_by_slug()
+
+    def get_tag_choices(self):
+        return [(slug, slug) for slug in self.tag_ids_by_slug]
+
+    def filter_tags(self, queryset, name, value):
+        """
+        Теги проверяются полусоединением EXISTS по связующей таблице,
+        поэтому рецепты не дублируются и DISTINCT не нужен.
+        tags_mode=any (по умолчанию) — хотя бы один из тегов,
+        tags_mode=all — все теги сразу.
+        """
+        if not value:
+            return queryset
+        tag_ids = {
+            self.tag_ids_by_slug[slug] for slug in value
+            if slug in self.tag_ids_by_slug
+        }
+        recipe_tags = Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk')
+        )
+        if self.form.cleaned_data.get('tags_mode') == TAGS_MODE_ALL:
+            for tag_id in tag_ids:
+                queryset = queryset.filter(
+                    Exists(recipe_tags.filter(tag_id=tag_id))
+                )
+            return queryset
+        return queryset.filter(
+            Exists(recipe_tags.filter(tag_id__in=tag_ids))
+        )
+
+    def filter_tags_mode(self, queryset, name, value):
         return queryset
 
-    def filter_is_in_shopping_cart(self, queryset, name, value):
+    def filter_user_list(self, queryset, model, value):
+        """
+        Рецепты из избранного или списка покупок пользователя:
+        коррелированный EXISTS, без выгрузки id в Python.
+        """
         if value and self.request.user.is_authenticated:
-            recipe_ids = list(
-                self.request.user.in_shopping_cart_of.values_list(
-                    'recipe_id', flat=True
-                )
-            )
-            return queryset.filter(id__in=recipe_ids)
+            return queryset.filter(Exists(model.objects.filter(
+                user=self.request.user, recipe=OuterRef('pk')
+            )))
         return queryset
+
+    def filter_is_favorited(self, queryset, name, value):
+        return self.filter_user_list(queryset, Favorite, value)
+
+    def filter_is_in_shopping_cart(self, queryset, name, value):
+        return self.filter_user_list(queryset, ShoppingCart, value)
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
@@ -0,0 +1,160 @@
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.utils import validate_file_name
+from django.db import connections, models, transaction
+from django.db.models.fields.files import ImageFieldFile
+from PIL import Image
+
+from core.cache import bump_cache_version
+from core.constants import (RECIPE_IMAGE_RENDITIONS, RECIPES_CACHE_NAME,
+                            RENDITIONS_DIR)
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_RENDITION_WORKERS,
+    thread_name_prefix='renditions',
+)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, в котором существующее имя не перезаписывается и не
+    получает суффикс: имена картинок рецептов — хеши содержимого
+    (см. ContentAddressedImageField), а имена уменьшенных копий построены
+    из них, поэтому одинаковое имя означает одинаковый файл.
+
+    Файл создается с O_EXCL: если его уже создала другая запись (в том
+    числе параллельная), FileSystemStorage._save просит у
+    get_available_name другое имя — здесь это означает, что файл уже есть,
+    и сохранение возвращает то же имя. Проверки exists() нет: между ней и
+    созданием файла его мог создать другой поток.
+    """
+
+    def save(self, name, content, max_length=None):
+        """Storage.save без подбора свободного имени."""
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self._save(name, content)
+        validate_file_name(name, allow_relative_path=True)
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        raise FileExistsError(name)
+
+    def _save(self, name, content):
+        try:
+            return super()._save(name, content)
+        except FileExistsError:
+            if not os.path.isdir(os.path.dirname(self.path(name))):
+                raise
+            return str(name).replace('\\', '/')
+
+
+def get_content_name(name, content):
+    """Имя файла — хеш содержимого с расширением исходного имени."""
+    content_hash = hashlib.sha256()
+    for chunk in content.chunks():
+        content_hash.update(chunk)
+    extension = os.path.splitext(name)[1].lower()
+    return f'{content_hash.hexdigest()}{extension}'
+
+
+class ContentAddressedImageFieldFile(ImageFieldFile):
+    def save(self, name, content, save=True):
+        super().save(get_content_name(name, content), content, save)
+
+
+class ContentAddressedImageField(models.ImageField):
+    """
+    Картинка, сохраняемая под именем-хешем содержимого, откуда бы она ни
+    пришла (API, админка, load_data): повторная загрузка того же файла не
+    создает копию, а другой файл с тем же исходным именем — не подменяется.
+    """
+    attr_class = ContentAddressedImageFieldFile
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('storage', ContentAddressedStorage())
+        super().__init__(*args, **kwargs)
+
+
+def get_rendition_name(image_name, size, extension):
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return f'{RENDITIONS_DIR}/{stem}_{size}.{extension}'
+
+
+def get_rendition_urls(image, ready):
+    """Адреса уменьшенных копий; пока их нет — адрес оригинала."""
+    if not image:
+        return None
+    extension = os.path.splitext(image.name)[1][1:].lower()
+    urls = {}
+    for size in RECIPE_IMAGE_RENDITIONS:
+        for key, rendition_extension in (
+            (size, extension), (f'{size}_webp', 'webp'),
+        ):
+            urls[key] = image.storage.url(
+                get_rendition_name(image.name, size, rendition_extension)
+            ) if ready else image.url
+    return urls
+
+
+def build_renditions(storage, image_name):
+    with storage.open(image_name) as file:
+        image = Image.open(file)
+        image.load()
+    extension = os.path.splitext(image_name)[1][1:].lower()
+    for size, dimensions in RECIPE_IMAGE_RENDITIONS.items():
+        thumbnail = image.copy()
+        thumbnail.thumbnail(dimensions)
+        for rendition_extension, image_format in (
+            (extension, image.format), ('webp', 'WEBP'),
+        ):
+            name = get_rendition_name(image_name, size, rendition_extension)
+            if storage.exists(name):
+                continue
+            buffer = BytesIO()
+            thumbnail.save(buffer, image_format)
+            storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def render_recipe_image(recipe_id):
+    from .models import Recipe
+
+    recipe = Recipe.objects.filter(pk=recipe_id).only('image').first()
+    if recipe is None or not recipe.image:
+        return False
+    build_renditions(recipe.image.storage, recipe.image.name)
+    updated = Recipe.objects.filter(
+        pk=recipe_id, image=recipe.image.name
+    ).update(image_renditions_ready=True)
+    if updated:
+        bump_cache_version(RECIPES_CACHE_NAME)
+    return bool(updated)
+
+
+def render_recipe_image_in_background(recipe_id):
+    try:
+        render_recipe_image(recipe_id)
+    except Exception:
+        logger.exception(
+            "Не удалось подготовить картинки рецепта %s.", recipe_id
+        )
+    finally:
+        connections.close_all()
+
+
+def schedule_renditions(recipe):
+    transaction.on_commit(partial(
+        executor.submit, render_recipe_image_in_background, recipe.pk
+    ))
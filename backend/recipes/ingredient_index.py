@@ -0,0 +1,69 @@
+import threading
+from bisect import bisect_left
+
+from core.cache import get_cache_version, is_cache_shared
+from core.constants import INGREDIENTS_CACHE_NAME
+from .models import Ingredient
+
+PREFIX_UPPER_BOUND = chr(0x10FFFF)
+
+
+def normalize(value):
+    return value.lower().replace('ё', 'е')
+
+
+class IngredientIndex:
+    """
+    Отсортированный индекс ингредиентов в памяти процесса.
+    Строится при первом обращении и перестраивается после invalidate(),
+    который сигналы вызывают после коммита изменений ингредиентов.
+    Если кэш общий для процессов, индекс перестраивается и по версии
+    кэша ингредиентов, которую меняют другие процессы; с локальным кэшем
+    изменения из других процессов видны после их перезапуска.
+    """
+
+    def __init__(self):
+        self._cached = None, None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def _build(self):
+        rows = sorted(
+            Ingredient.objects.values('id', 'name', 'measurement_unit'),
+            key=lambda row: (normalize(row['name']), row['name'], row['id']),
+        )
+        return [normalize(row['name']) for row in rows], rows
+
+    def _get_version(self):
+        if not is_cache_shared():
+            return self._generation
+        return self._generation, get_cache_version(INGREDIENTS_CACHE_NAME)
+
+    def _get_index(self):
+        cached_version, index = self._cached
+        if index is None or cached_version != self._get_version():
+            with self._lock:
+                # Поколение читается до построения: сброс во время
+                # построения заставит следующее обращение построить заново.
+                version = self._get_version()
+                cached_version, index = self._cached
+                if index is None or cached_version != version:
+                    index = self._build()
+                    self._cached = version, index
+        return index
+
+    def all(self):
+        return self._get_index()[1]
+
+    def search(self, prefix):
+        keys, rows = self._get_index()
+        prefix = normalize(prefix)
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + PREFIX_UPPER_BOUND, lo=start)
+        return rows[start:end]
+
+    def invalidate(self):
+        self._generation += 1
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,140 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from statistics import quantiles
+from time import perf_counter
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Recipe, ShoppingCart
+
+SERVER_PORT = 80
+
+
+class Command(BaseCommand):
+    help = ("Сравнивает пропускную способность и p99 эндпоинтов чтения под "
+            "конкурентной нагрузкой в WSGI- и ASGI-приложении. Запросы "
+            "подаются прямо в приложения, без HTTP-сервера.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=16)
+
+    def handle(self, *args, **options):
+        from foodgram.asgi import application as asgi_application
+        from foodgram.wsgi import application as wsgi_application
+
+        host = settings.ALLOWED_HOSTS[0].lstrip('.')
+        self.server = ('localhost' if host == '*' else host, SERVER_PORT)
+        recipe = Recipe.objects.order_by('-pub_date').first()
+        if recipe is None:
+            raise CommandError("Нет рецептов. Сначала загрузите данные.")
+        endpoints = [
+            ('/api/tags/', None),
+            ('/api/ingredients/?name=%D0%B0', None),
+            ('/api/recipes/', None),
+            (f'/api/recipes/{recipe.pk}/', None),
+        ]
+        cart = ShoppingCart.objects.select_related('user').first()
+        if cart is not None:
+            token, _ = Token.objects.get_or_create(user=cart.user)
+            endpoints.append(
+                ('/api/recipes/download_shopping_cart/', token.key)
+            )
+
+        for url, token in endpoints:
+            for label, run in (
+                ('wsgi', lambda: self.run_wsgi(wsgi_application, url, token,
+                                               options)),
+                ('asgi', lambda: asyncio.run(self.run_asgi(
+                    asgi_application, url, token, options
+                ))),
+            ):
+                started = perf_counter()
+                timings = run()
+                self.report(label, url, timings, perf_counter() - started)
+
+    def report(self, label, url, timings, elapsed):
+        p50, p99 = (quantiles(timings, n=100)[index] for index in (49, 98))
+        self.stdout.write(
+            f"{label} {url}: {len(timings) / elapsed:.0f} запр/с, "
+            f"p50 {p50 * 1000:.1f} мс, p99 {p99 * 1000:.1f} мс"
+        )
+
+    def run_wsgi(self, application, url, token, options):
+        parts = urlsplit(url)
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': parts.path,
+            'QUERY_STRING': parts.query,
+            'SERVER_NAME': self.server[0],
+            'SERVER_PORT': str(self.server[1]),
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'wsgi.url_scheme': 'http',
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        if token:
+            environ['HTTP_AUTHORIZATION'] = f'Token {token}'
+
+        def request(_):
+            started = perf_counter()
+            statuses = []
+            body = application(
+                {**environ, 'wsgi.input': BytesIO()},
+                lambda status, headers: statuses.append(status),
+            )
+            b''.join(body)
+            body.close()
+            if not statuses[0].startswith('200'):
+                raise CommandError(f"{url}: ответ {statuses[0]}")
+            return perf_counter() - started
+
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            return list(executor.map(request, range(options['requests'])))
+
+    async def run_asgi(self, application, url, token, options):
+        parts = urlsplit(url)
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': parts.path,
+            'root_path': '',
+            'query_string': parts.query.encode(),
+            'headers': [(b'host', self.server[0].encode())],
+            'server': self.server,
+            'client': ('127.0.0.1', 0),
+        }
+        if token:
+            scope['headers'].append(
+                (b'authorization', f'Token {token}'.encode())
+            )
+        semaphore = asyncio.Semaphore(options['concurrency'])
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def request():
+            statuses = []
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+
+            async with semaphore:
+                started = perf_counter()
+                await application(scope, receive, send)
+                if statuses[0] != 200:
+                    raise CommandError(f"{url}: ответ {statuses[0]}")
+                return perf_counter() - started
+
+        return await asyncio.gather(
+            *(request() for _ in range(options['requests']))
+        )
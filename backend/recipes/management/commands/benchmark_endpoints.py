@@ -0,0 +1,175 @@
+import json
+from io import StringIO
+from pathlib import Path
+from statistics import mean, quantiles
+from time import perf_counter
+
+import django
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from core.cache import bump_cache_version
+from core.constants import (INGREDIENTS_CACHE_NAME, RECIPES_CACHE_NAME,
+                            TAGS_CACHE_NAME)
+from recipes.models import Recipe, ShoppingCart, Tag
+from users.models import User
+from .generate_data import EMAIL_DOMAIN, TAG_SLUG_PREFIX
+
+
+class Command(BaseCommand):
+    help = ("Замеряет время ответа эндпоинтов API на синтетических данных "
+            "нескольких размеров и сохраняет результаты в JSON. Данные "
+            "генерируются командой generate_data в транзакции и "
+            "откатываются после замера.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='1000,10000',
+            help="Числа рецептов через запятую.",
+        )
+        parser.add_argument(
+            '--recipes-per-user', type=int, default=10,
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--output', type=Path, default=Path('benchmark-results.json'),
+        )
+        parser.add_argument(
+            '--baseline',
+            type=Path,
+            help="Прошлые результаты для сравнения медиан.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError("--sizes: ожидаются числа через запятую.")
+        host = settings.ALLOWED_HOSTS[0].lstrip('.')
+        self.host = 'localhost' if host == '*' else host
+        results = {
+            'seed': options['seed'],
+            'repeat': options['repeat'],
+            'database': connection.vendor,
+            'django': django.get_version(),
+            'sizes': {},
+        }
+        for size in sizes:
+            self.stdout.write(f"Рецептов: {size}")
+            with transaction.atomic():
+                call_command(
+                    'generate_data',
+                    seed=options['seed'],
+                    recipes=size,
+                    users=max(size // options['recipes_per_user'], 2),
+                    stdout=StringIO(),
+                )
+                results['sizes'][str(size)] = self.run_endpoints(
+                    options['repeat']
+                )
+                transaction.set_rollback(True)
+            for name in (INGREDIENTS_CACHE_NAME, TAGS_CACHE_NAME,
+                         RECIPES_CACHE_NAME):
+                bump_cache_version(name)
+
+        options['output'].write_text(
+            json.dumps(results, ensure_ascii=False, indent=2)
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Результаты сохранены в {options['output']}"
+        ))
+        if options['baseline']:
+            self.compare(
+                json.loads(options['baseline'].read_text()), results
+            )
+
+    def get_endpoints(self):
+        user = ShoppingCart.objects.filter(
+            user__email__endswith=f'@{EMAIL_DOMAIN}'
+        ).order_by('user_id').values_list('user', flat=True).first()
+        user = User.objects.get(pk=user)
+        recipe = Recipe.objects.filter(
+            author__email__endswith=f'@{EMAIL_DOMAIN}'
+        ).order_by('id').first()
+        slugs = list(Tag.objects.filter(
+            slug__startswith=TAG_SLUG_PREFIX
+        ).order_by('id').values_list('slug', flat=True)[:2])
+        tags = '&'.join(f'tags={slug}' for slug in slugs)
+        return user, {
+            'recipes.list': '/api/recipes/',
+            'recipes.list.limit_50': '/api/recipes/?limit=50',
+            'recipes.list.cursor': '/api/recipes/?cursor=',
+            'recipes.detail': f'/api/recipes/{recipe.pk}/',
+            'recipes.filter.tags': f'/api/recipes/?{tags}',
+            'recipes.filter.author':
+                f'/api/recipes/?author={recipe.author_id}',
+            'recipes.filter.is_favorited': '/api/recipes/?is_favorited=1',
+            'recipes.filter.is_in_shopping_cart':
+                '/api/recipes/?is_in_shopping_cart=1',
+            'recipes.search': '/api/recipes/?search=суп',
+            'recipes.feed': '/api/recipes/feed/',
+            'recipes.shopping_cart_summary':
+                '/api/recipes/shopping_cart_summary/',
+            'recipes.download_shopping_cart':
+                '/api/recipes/download_shopping_cart/',
+            'users.list': '/api/users/',
+            'users.subscriptions':
+                '/api/users/subscriptions/?recipes_limit=3',
+            'ingredients.search': '/api/ingredients/?name=аб',
+            'tags.list': '/api/tags/',
+        }
+
+    def request(self, client, url):
+        response = client.get(url)
+        if response.status_code != 200:
+            raise CommandError(f"{url}: ответ {response.status_code}")
+        if response.streaming:
+            b''.join(response.streaming_content)
+
+    def run_endpoints(self, repeat):
+        user, endpoints = self.get_endpoints()
+        client = APIClient(HTTP_HOST=self.host)
+        client.force_authenticate(user)
+        results = {}
+        for name, url in endpoints.items():
+            with CaptureQueriesContext(connection) as context:
+                self.request(client, url)
+            queries = len(context.captured_queries)
+            timings = []
+            for _ in range(repeat):
+                started = perf_counter()
+                self.request(client, url)
+                timings.append((perf_counter() - started) * 1000)
+            percentiles = quantiles(timings, n=100)
+            results[name] = {
+                'url': url,
+                'queries': queries,
+                'mean_ms': round(mean(timings), 2),
+                'p50_ms': round(percentiles[49], 2),
+                'p95_ms': round(percentiles[94], 2),
+                'max_ms': round(max(timings), 2),
+            }
+            self.stdout.write(
+                f"  {name}: p50 {results[name]['p50_ms']} мс, "
+                f"запросов к БД {results[name]['queries']}"
+            )
+        return results
+
+    def compare(self, baseline, results):
+        self.stdout.write("Изменение медианы относительно baseline:")
+        for size, endpoints in results['sizes'].items():
+            for name, result in endpoints.items():
+                before = baseline['sizes'].get(size, {}).get(name)
+                if before is None:
+                    continue
+                change = (result['p50_ms'] / before['p50_ms'] - 1) * 100
+                self.stdout.write(
+                    f"  {size} {name}: {before['p50_ms']} -> "
+                    f"{result['p50_ms']} мс ({change:+.0f}%), запросов "
+                    f"{before['queries']} -> {result['queries']}"
+                )
@@ -0,0 +1,97 @@
+from io import StringIO
+from statistics import median
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management import BaseCommand, call_command
+from django.db import transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from core.cache import bump_cache_version
+from core.constants import (INGREDIENTS_CACHE_NAME, RECIPES_CACHE_NAME,
+                            TAGS_CACHE_NAME)
+from recipes.fast_read import get_recipe_rows, serialize_recipe_rows
+from recipes.models import ShoppingCart
+from recipes.serializers import RecipeReadSerializer
+from recipes.views import RecipeViewSet
+from users.models import User
+from .generate_data import EMAIL_DOMAIN
+
+
+class Command(BaseCommand):
+    help = ("Сравнивает скорость RecipeReadSerializer и быстрого чтения "
+            "(RECIPE_FAST_READ) в рецептах в секунду, вместе с запросами "
+            "к БД. Данные генерируются командой generate_data в "
+            "транзакции и откатываются.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument(
+            '--page-sizes',
+            default='6,50,200',
+            help="Размеры страниц через запятую.",
+        )
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        page_sizes = [int(size) for size in options['page_sizes'].split(',')]
+        with transaction.atomic():
+            call_command(
+                'generate_data', seed=options['seed'],
+                recipes=options['recipes'],
+                users=max(options['recipes'] // 10, 2),
+                stdout=StringIO(),
+            )
+            queryset = self.get_queryset()
+            for page_size in page_sizes:
+                # Срез каждый раз новый: иначе выборка закэширует строки.
+                serializer = self.measure(
+                    lambda: RecipeReadSerializer(
+                        queryset[:page_size], many=True,
+                        context={'request': self.request},
+                    ).data,
+                    options['repeat'],
+                )
+                fast_read = self.measure(
+                    lambda: serialize_recipe_rows(
+                        get_recipe_rows(queryset[:page_size]), self.request
+                    ),
+                    options['repeat'],
+                )
+                self.stdout.write(
+                    f"страница {page_size}: сериализатор "
+                    f"{page_size / serializer:.0f} рец/с, быстрое чтение "
+                    f"{page_size / fast_read:.0f} рец/с "
+                    f"(x{serializer / fast_read:.1f})"
+                )
+            transaction.set_rollback(True)
+        for name in (INGREDIENTS_CACHE_NAME, TAGS_CACHE_NAME,
+                     RECIPES_CACHE_NAME):
+            bump_cache_version(name)
+
+    def get_queryset(self):
+        """Выборка списка рецептов от имени пользователя со списком покупок."""
+        user = User.objects.get(pk=ShoppingCart.objects.filter(
+            user__email__endswith=f'@{EMAIL_DOMAIN}'
+        ).order_by('user_id').values_list('user', flat=True).first())
+        host = settings.ALLOWED_HOSTS[0].lstrip('.')
+        request = Request(APIRequestFactory().get(
+            '/api/recipes/', HTTP_HOST='localhost' if host == '*' else host
+        ))
+        request.user = user
+        self.request = request
+        view = RecipeViewSet(request=request, action='list', kwargs={},
+                             format_kwarg=None)
+        return view.get_queryset()
+
+    def measure(self, serialize, repeat):
+        """Медиана времени одной страницы; первый прогон — прогрев."""
+        serialize()
+        timings = []
+        for _ in range(repeat):
+            started = perf_counter()
+            serialize()
+            timings.append(perf_counter() - started)
+        return median(timings)
@@ -0,0 +1,56 @@
+import random
+from time import perf_counter
+
+from django.core.management import BaseCommand, CommandError
+
+from recipes.ingredient_index import ingredient_index
+from recipes.models import Ingredient
+from recipes.serializers import IngredientSerializer
+
+
+class Command(BaseCommand):
+    help = ("Сравнивает поиск ингредиентов по префиксу через БД "
+            "и через индекс в памяти.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not names:
+            raise CommandError(
+                "Нет ингредиентов: сначала выполните load_data."
+            )
+        rng = random.Random(options['seed'])
+        prefixes = [
+            rng.choice(names)[:rng.randint(1, 4)]
+            for _ in range(options['repeat'])
+        ]
+
+        start = perf_counter()
+        for prefix in prefixes:
+            IngredientSerializer(
+                Ingredient.objects.filter(name__istartswith=prefix),
+                many=True,
+            ).data
+        database_time = perf_counter() - start
+
+        ingredient_index.invalidate()
+        start = perf_counter()
+        ingredient_index.all()
+        build_time = perf_counter() - start
+
+        start = perf_counter()
+        for prefix in prefixes:
+            ingredient_index.search(prefix)
+        index_time = perf_counter() - start
+
+        repeat = len(prefixes)
+        self.stdout.write(
+            f"Запросов: {repeat}, ингредиентов: {len(names)}\n"
+            f"БД:     {database_time / repeat * 1000:.3f} мс/запрос\n"
+            f"Индекс: {index_time / repeat * 1000:.3f} мс/запрос "
+            f"(построение {build_time * 1000:.1f} мс)\n"
+            f"Ускорение: x{database_time / max(index_time, 1e-9):.1f}"
+        )
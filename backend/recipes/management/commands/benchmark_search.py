@@ -0,0 +1,94 @@
+import random
+from time import perf_counter
+
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from recipes.models import Recipe
+from recipes.search import search_recipes
+from users.models import User
+
+BATCH_SIZE = 5000
+PAGE_SIZE = 6
+WORDS = (
+    'суп', 'борщ', 'щи', 'солянка', 'котлеты', 'пирог', 'пирожки', 'салат',
+    'курица', 'говядина', 'свинина', 'индейка', 'рыба', 'лосось', 'грибы',
+    'картофель', 'морковь', 'капуста', 'томаты', 'сыр', 'сметана', 'тесто',
+    'запеченный', 'жареный', 'тушеный', 'домашний', 'быстрый', 'острый',
+    'сладкий', 'нарезать', 'обжарить', 'варить', 'посолить', 'подавать',
+)
+
+
+class Command(BaseCommand):
+    help = ("Сравнивает полнотекстовый поиск рецептов с поиском по "
+            "подстроке на синтетическом корпусе. Данные создаются в "
+            "транзакции и откатываются после замера.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100_000)
+        parser.add_argument('--text-words', type=int, default=60)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            self.generate(rng, options)
+            self.run(rng, options)
+            transaction.set_rollback(True)
+
+    def generate(self, rng, options):
+        started = perf_counter()
+        author = User.objects.create(
+            username='benchmark', email='benchmark@foodgram.ru',
+            first_name='Бенчмарк', last_name='Бенчмарк',
+        )
+        for offset in range(0, options['recipes'], BATCH_SIZE):
+            size = min(BATCH_SIZE, options['recipes'] - offset)
+            Recipe.objects.bulk_create(
+                Recipe(
+                    author=author,
+                    name=' '.join(rng.sample(WORDS, 3)),
+                    text=' '.join(rng.choices(WORDS,
+                                              k=options['text_words'])),
+                    cooking_time=1,
+                    image='recipes/benchmark.png',
+                )
+                for _ in range(size)
+            )
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE recipes_recipe')
+        self.stdout.write(
+            f"Создано рецептов: {options['recipes']} "
+            f"за {perf_counter() - started:.1f} с"
+        )
+
+    def run(self, rng, options):
+        variants = {
+            'icontains (было)': self.icontains,
+            'search_recipes': lambda words: search_recipes(
+                Recipe.objects.all(), ' '.join(words)
+            ),
+        }
+        samples = [
+            rng.sample(WORDS, rng.randint(1, 2))
+            for _ in range(options['repeat'])
+        ]
+        for label, build_queryset in variants.items():
+            started = perf_counter()
+            for words in samples:
+                queryset = build_queryset(words)
+                queryset.values('pk').count()
+                list(queryset[:PAGE_SIZE])
+            elapsed = (perf_counter() - started) / len(samples)
+            self.stdout.write(f"{label}: {elapsed * 1000:.1f} мс на запрос")
+
+    def icontains(self, words):
+        queryset = Recipe.objects.all()
+        for word in words:
+            queryset = queryset.filter(
+                Q(name__icontains=word) | Q(text__icontains=word)
+            )
+        return queryset
@@ -0,0 +1,125 @@
+import random
+from time import perf_counter
+
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from core.cache import bump_cache_version
+from core.constants import TAGS_CACHE_NAME
+from recipes.filters import RecipeFilter
+from recipes.models import Recipe, Tag
+from users.models import User
+
+BATCH_SIZE = 5000
+PAGE_SIZE = 6
+BENCHMARK_COLOR = 0xABC000
+
+
+class Command(BaseCommand):
+    help = ("Сравнивает старую фильтрацию рецептов по тегам (JOIN + DISTINCT) "
+            "с EXISTS на синтетических данных. Данные создаются в "
+            "транзакции и откатываются после замера.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100_000)
+        parser.add_argument('--tags', type=int, default=30)
+        parser.add_argument('--max-tags-per-recipe', type=int, default=4)
+        parser.add_argument('--filter-tags', type=int, default=5)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            slugs = self.generate(rng, options)
+            bump_cache_version(TAGS_CACHE_NAME)
+            self.run(rng, slugs, options)
+            transaction.set_rollback(True)
+        bump_cache_version(TAGS_CACHE_NAME)
+
+    def generate(self, rng, options):
+        started = perf_counter()
+        author = User.objects.create(
+            username='benchmark', email='benchmark@foodgram.ru',
+            first_name='Бенчмарк', last_name='Бенчмарк',
+        )
+        Tag.objects.bulk_create(
+            Tag(
+                name=f'benchmark {index}',
+                color=f'#{BENCHMARK_COLOR + index:06x}',
+                slug=f'benchmark-{index}',
+            )
+            for index in range(options['tags'])
+        )
+        tags = list(Tag.objects.filter(slug__startswith='benchmark-'))
+        RecipeTag = Recipe.tags.through
+        for offset in range(0, options['recipes'], BATCH_SIZE):
+            size = min(BATCH_SIZE, options['recipes'] - offset)
+            recipes = Recipe.objects.bulk_create(
+                Recipe(
+                    author=author,
+                    name='Бенчмарк',
+                    text='Бенчмарк',
+                    cooking_time=1,
+                    image='recipes/benchmark.png',
+                )
+                for _ in range(size)
+            )
+            if recipes[0].pk is None:
+                recipes = Recipe.objects.filter(
+                    author=author
+                ).order_by('-id')[:size]
+            RecipeTag.objects.bulk_create(
+                RecipeTag(recipe_id=recipe.pk, tag_id=tag.pk)
+                for recipe in recipes
+                for tag in rng.sample(
+                    tags, rng.randint(1, options['max_tags_per_recipe'])
+                )
+            )
+        self.stdout.write(
+            f"Создано рецептов: {options['recipes']}, тегов: {len(tags)} "
+            f"за {perf_counter() - started:.1f} с"
+        )
+        return [tag.slug for tag in tags]
+
+    def run(self, rng, slugs, options):
+        factory = APIRequestFactory()
+        variants = {
+            'join + distinct (было)': self.join_distinct,
+            'exists, any': lambda selected: self.exists(factory, selected,
+                                                        'any'),
+            'exists, all': lambda selected: self.exists(factory, selected,
+                                                        'all'),
+        }
+        samples = [
+            rng.sample(slugs, options['filter_tags'])
+            for _ in range(options['repeat'])
+        ]
+        for label, build_queryset in variants.items():
+            started = perf_counter()
+            for selected in samples:
+                queryset = build_queryset(selected)
+                queryset.count()
+                list(queryset[:PAGE_SIZE])
+            elapsed = (perf_counter() - started) / len(samples)
+            self.stdout.write(f"{label}: {elapsed * 1000:.1f} мс на запрос")
+
+    def join_distinct(self, selected):
+        list(Tag.objects.filter(slug__in=selected))
+        condition = Q()
+        for slug in selected:
+            condition |= Q(tags__slug=slug)
+        return Recipe.objects.filter(condition).distinct()
+
+    def exists(self, factory, selected, mode):
+        request = Request(factory.get(
+            '/api/recipes/', {'tags': selected, 'tags_mode': mode}
+        ))
+        view = type('View', (), {'filterset_class': RecipeFilter})
+        return DjangoFilterBackend().filter_queryset(
+            request, Recipe.objects.all(), view
+        )
@@ -0,0 +1,20 @@
+from django.core.management import BaseCommand
+
+from recipes.images import render_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ("Готовит уменьшенные копии и WebP-версии картинок рецептов, "
+            "для которых они еще не созданы.")
+
+    def handle(self, *args, **options):
+        recipe_ids = Recipe.objects.filter(
+            image_renditions_ready=False
+        ).values_list('id', flat=True)
+        done = 0
+        for recipe_id in recipe_ids.iterator():
+            done += render_recipe_image(recipe_id)
+        self.stdout.write(self.style.SUCCESS(
+            f"Обработано рецептов: {done}."
+        ))
@@ -0,0 +1,51 @@
+from itertools import islice
+
+from django.core.management import BaseCommand
+
+from core.constants import SHOPPING_CART_CHUNK_SIZE
+from recipes.models import CartIngredient, ShoppingCart
+from recipes.shopping_cart import get_cart_totals, rebuild_carts
+
+
+class Command(BaseCommand):
+    help = ("Сверяет суммы ингредиентов списков покупок с пересчетом по "
+            "рецептам и пересобирает расходящиеся списки.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Только сообщить о расхождениях, ничего не исправляя.",
+        )
+
+    def handle(self, *args, **options):
+        user_ids = ShoppingCart.objects.values_list(
+            'user_id', flat=True
+        ).union(
+            CartIngredient.objects.values_list('user_id', flat=True)
+        ).order_by('user_id').iterator()
+        drifted = []
+        while batch := list(islice(user_ids, SHOPPING_CART_CHUNK_SIZE)):
+            expected = set(get_cart_totals(batch))
+            actual = set(CartIngredient.objects.filter(
+                user_id__in=batch
+            ).values_list('user_id', 'ingredient_id', 'amount'))
+            drifted.extend(sorted(
+                {user_id for user_id, _, _ in expected ^ actual}
+            ))
+
+        self.stdout.write(f"Списков покупок с расхождениями: {len(drifted)}")
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("Суммы списков совпадают."))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                f"Пользователи: {', '.join(map(str, drifted))}."
+            ))
+        else:
+            for start in range(0, len(drifted), SHOPPING_CART_CHUNK_SIZE):
+                rebuild_carts(
+                    drifted[start:start + SHOPPING_CART_CHUNK_SIZE]
+                )
+            self.stdout.write(self.style.SUCCESS(
+                f"Пересобрано списков: {len(drifted)}."
+            ))
@@ -0,0 +1,285 @@
+import random
+from io import BytesIO
+from itertools import islice
+from pathlib import Path
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+
+from core.cache import bump_cache_version
+from core.constants import (FEED_FANOUT_MAX_FOLLOWERS, INGREDIENTS_CACHE_NAME,
+                            RECIPES_CACHE_NAME, TAGS_CACHE_NAME)
+from recipes.counters import COUNTERS, count_subquery
+from recipes.feed import backfill
+from recipes.ingredient_index import ingredient_index
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from recipes.shopping_cart import rebuild_carts
+from users.models import Subscribe, User
+from .load_data import read_rows
+
+EMAIL_DOMAIN = 'synthetic.foodgram.ru'
+TAG_SLUG_PREFIX = 'synthetic-'
+PASSWORD = 'synthetic-password'
+LETTERS = 'абвгдежзиклмнопрстуфхцчшэюя'
+FIRST_NAMES = ('Анна', 'Иван', 'Мария', 'Петр', 'Ольга', 'Сергей', 'Елена',
+               'Дмитрий', 'Наталья', 'Алексей', 'Ирина', 'Михаил')
+LAST_NAMES = ('Иванова', 'Петров', 'Смирнова', 'Кузнецов', 'Попова',
+              'Соколов', 'Лебедева', 'Козлов', 'Новикова', 'Морозов')
+DISHES = ('суп', 'борщ', 'салат', 'пирог', 'рагу', 'плов', 'омлет', 'каша',
+          'запеканка', 'котлеты', 'блины', 'паста', 'ризотто', 'жаркое')
+ADJECTIVES = ('домашний', 'быстрый', 'праздничный', 'летний', 'зимний',
+              'острый', 'сытный', 'легкий', 'бабушкин', 'деревенский')
+STEPS = ('Нарежьте', 'Обжарьте', 'Смешайте', 'Отварите', 'Запеките',
+         'Потушите', 'Добавьте')
+PLACEHOLDER_SIZE = (600, 400)
+
+
+def letters(number):
+    """Номер в виде букв: имена должны проходить name_validator."""
+    word = ''
+    while True:
+        number, index = divmod(number, len(LETTERS))
+        word = LETTERS[index] + word
+        if not number:
+            return word
+
+
+def batched(objects, batch_size):
+    objects = iter(objects)
+    while batch := list(islice(objects, batch_size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = ("Генерирует синтетические данные: пользователей, теги, рецепты "
+            "с ингредиентами из data/ingredients.csv, избранное, списки "
+            "покупок и подписки. Результат определяется параметром --seed.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10_000)
+        parser.add_argument('--tags', type=int, default=20)
+        parser.add_argument('--max-ingredients', type=int, default=10)
+        parser.add_argument('--max-tags', type=int, default=3)
+        parser.add_argument('--favorites', type=int, default=20,
+                            help="Избранных рецептов на пользователя.")
+        parser.add_argument('--carts', type=int, default=5,
+                            help="Рецептов в списке покупок пользователя.")
+        parser.add_argument('--subscriptions', type=int, default=10,
+                            help="Подписок на пользователя.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help="Сначала удалить ранее сгенерированные данные.",
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 2 or options['recipes'] < 1:
+            raise CommandError("Нужно хотя бы 2 пользователя и 1 рецепт.")
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        with transaction.atomic():
+            if options['clear']:
+                self.clear()
+            ingredient_ids = self.load_ingredients()
+            user_ids = self.create_users(options['users'])
+            tag_ids = self.create_tags(options['tags'])
+            recipe_ids = self.create_recipes(user_ids, options['recipes'])
+            self.step('recipe ingredients', self.create_recipe_ingredients,
+                      recipe_ids, ingredient_ids, options['max_ingredients'])
+            self.step('recipe tags', self.create_recipe_tags,
+                      recipe_ids, tag_ids, options['max_tags'])
+            self.step('favorites', self.create_user_recipes, Favorite,
+                      user_ids, recipe_ids, options['favorites'])
+            self.step('shopping carts', self.create_user_recipes,
+                      ShoppingCart, user_ids, recipe_ids, options['carts'])
+            self.step('subscriptions', self.create_subscriptions,
+                      user_ids, options['subscriptions'])
+            self.step('counters', self.fill_counters)
+            self.step('cart totals', self.fill_cart_totals, user_ids)
+            self.step('feeds', self.fill_feeds, user_ids)
+        for name in (INGREDIENTS_CACHE_NAME, TAGS_CACHE_NAME,
+                     RECIPES_CACHE_NAME):
+            bump_cache_version(name)
+        ingredient_index.invalidate()
+        self.stdout.write(self.style.SUCCESS("Данные сгенерированы."))
+
+    def step(self, label, create, *args):
+        started = perf_counter()
+        rows = create(*args)
+        elapsed = f"{perf_counter() - started:.1f} с"
+        if rows is None:
+            self.stdout.write(f"{label}: {elapsed}")
+        else:
+            self.stdout.write(f"{label}: {rows} строк за {elapsed}")
+
+    def bulk_create(self, model, objects):
+        rows = 0
+        for batch in batched(objects, self.batch_size):
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+            rows += len(batch)
+        return rows
+
+    def clear(self):
+        User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').delete()
+        Tag.objects.filter(slug__startswith=TAG_SLUG_PREFIX).delete()
+
+    def load_ingredients(self):
+        if not Ingredient.objects.exists():
+            path = Path(settings.BASE_DIR) / 'data' / 'ingredients.csv'
+            self.bulk_create(Ingredient, (
+                Ingredient(name=row['name'],
+                           measurement_unit=row['measurement_unit'])
+                for row in read_rows(path)
+            ))
+        return list(Ingredient.objects.order_by('id').values_list(
+            'id', flat=True
+        ))
+
+    def create_users(self, count):
+        if User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').exists():
+            raise CommandError(
+                "Синтетические данные уже есть, добавьте --clear."
+            )
+        password = make_password(PASSWORD)
+        self.step('users', self.bulk_create, User, (
+            User(
+                username=f'synthetic_{number}',
+                email=f'synthetic_{number}@{EMAIL_DOMAIN}',
+                first_name=self.rng.choice(FIRST_NAMES),
+                last_name=self.rng.choice(LAST_NAMES),
+                password=password,
+            )
+            for number in range(count)
+        ))
+        return list(User.objects.filter(
+            email__endswith=f'@{EMAIL_DOMAIN}'
+        ).order_by('id').values_list('id', flat=True))
+
+    def create_tags(self, count):
+        self.step('tags', self.bulk_create, Tag, (
+            Tag(
+                name=f'тег {letters(number)}',
+                color=f'#{(0x5A5A5A + number * 7919) % 0x1000000:06x}',
+                slug=f'{TAG_SLUG_PREFIX}{number}',
+            )
+            for number in range(count)
+        ))
+        return list(Tag.objects.filter(
+            slug__startswith=TAG_SLUG_PREFIX
+        ).order_by('id').values_list('id', flat=True))
+
+    def create_recipes(self, user_ids, count):
+        image = self.save_placeholder_image()
+        self.step('recipes', self.bulk_create, Recipe, (
+            Recipe(
+                author_id=self.rng.choice(user_ids),
+                name=f'{self.rng.choice(ADJECTIVES)} '
+                     f'{self.rng.choice(DISHES)} {letters(number)}',
+                text=' '.join(
+                    f'{self.rng.choice(STEPS)} {self.rng.choice(DISHES)}.'
+                    for _ in range(self.rng.randint(3, 8))
+                ),
+                cooking_time=self.rng.randint(5, 180),
+                image=image,
+            )
+            for number in range(count)
+        ))
+        return list(Recipe.objects.filter(
+            author__email__endswith=f'@{EMAIL_DOMAIN}'
+        ).order_by('id').values_list('id', flat=True))
+
+    def save_placeholder_image(self):
+        buffer = BytesIO()
+        Image.new('RGB', PLACEHOLDER_SIZE, '#E26C2D').save(buffer, 'PNG')
+        field = Recipe._meta.get_field('image')
+        return field.storage.save(
+            field.generate_filename(None, 'synthetic.png'),
+            ContentFile(buffer.getvalue()),
+        )
+
+    def create_recipe_ingredients(self, recipe_ids, ingredient_ids,
+                                  max_ingredients):
+        return self.bulk_create(RecipeIngredient, (
+            RecipeIngredient(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_id,
+                amount=self.rng.randint(1, 500),
+            )
+            for recipe_id in recipe_ids
+            for ingredient_id in self.rng.sample(
+                ingredient_ids,
+                min(self.rng.randint(1, max_ingredients),
+                    len(ingredient_ids)),
+            )
+        ))
+
+    def create_recipe_tags(self, recipe_ids, tag_ids, max_tags):
+        if not tag_ids:
+            return 0
+        RecipeTag = Recipe.tags.through
+        return self.bulk_create(RecipeTag, (
+            RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in self.rng.sample(
+                tag_ids, min(self.rng.randint(1, max_tags), len(tag_ids))
+            )
+        ))
+
+    def create_user_recipes(self, model, user_ids, recipe_ids, per_user):
+        return self.bulk_create(model, (
+            model(user_id=user_id, recipe_id=recipe_id)
+            for user_id in user_ids
+            for recipe_id in self.rng.sample(
+                recipe_ids, min(per_user, len(recipe_ids))
+            )
+        ))
+
+    def create_subscriptions(self, user_ids, per_user):
+        return self.bulk_create(Subscribe, (
+            Subscribe(user_id=user_id, subscribing_id=author_id)
+            for user_id in user_ids
+            for author_id in [
+                author_id for author_id in self.rng.sample(
+                    user_ids, min(per_user + 1, len(user_ids))
+                )
+                if author_id != user_id
+            ][:per_user]
+        ))
+
+    def fill_counters(self):
+        """bulk_create не шлет сигналы — пересчитываем счетчики."""
+        scopes = {
+            Recipe: {'author__email__endswith': f'@{EMAIL_DOMAIN}'},
+            User: {'email__endswith': f'@{EMAIL_DOMAIN}'},
+        }
+        for model, field, counted_model, relation in COUNTERS:
+            model.objects.filter(**scopes[model]).update(
+                **{field: count_subquery(counted_model, relation)}
+            )
+
+    def fill_cart_totals(self, user_ids):
+        for batch in batched(user_ids, self.batch_size):
+            rebuild_carts(batch)
+
+    def fill_feeds(self, user_ids):
+        authors = User.objects.filter(
+            pk__in=user_ids,
+            followers_count__gt=0,
+            followers_count__lte=FEED_FANOUT_MAX_FOLLOWERS,
+        ).order_by('id').values_list('id', flat=True)
+        for author_id in authors:
+            backfill(
+                Subscribe.objects.filter(
+                    subscribing_id=author_id
+                ).values_list('user_id', flat=True),
+                author_id,
+            )
@@ -1,38 +1,315 @@
 import csv
-from io import StringIO
+import json
+from io import BytesIO, StringIO
+from itertools import islice
+from pathlib import Path
+from time import perf_counter
 
-from django.apps import apps
 from django.conf import settings
-from django.core.management import BaseCommand, CommandError, call_command
-from django.db import connection
+from django.core.files.base import ContentFile
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from PIL import Image
 
-from recipes.models import Ingredient
+from core.cache import bump_cache_version
+from core.constants import (INGREDIENTS_CACHE_NAME, RECIPES_CACHE_NAME,
+                            TAGS_CACHE_NAME)
+from recipes.images import schedule_renditions
+from recipes.ingredient_index import ingredient_index
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
 
-DATA = {
-    Ingredient: 'ingredients.csv',
-}
+DATASETS = ('ingredients', 'tags', 'recipes')
+DEFAULT_DATASETS = ('ingredients', 'tags')
+DEFAULT_BATCH_SIZE = 1000
+JSON_CHUNK_SIZE = 64 * 1024
+PLACEHOLDER_SIZE = (600, 400)
+PLACEHOLDER_COLOR = '#E26C2D'
+
+
+def iter_json_array(data):
+    """
+    Элементы JSON-массива по одному: файл читается кусками по
+    JSON_CHUNK_SIZE, в памяти только текущий кусок и разбираемый объект.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, eof = '', 0, False
+    expected = '['
+    while True:
+        while position < len(buffer) and buffer[position].isspace():
+            position += 1
+        if position == len(buffer):
+            if eof:
+                raise CommandError("JSON-файл оборвался до конца массива.")
+            buffer, position = data.read(JSON_CHUNK_SIZE), 0
+            eof = not buffer
+            continue
+        char = buffer[position]
+        if expected == '[':
+            if char != '[':
+                raise CommandError("JSON-файл должен содержать массив.")
+            position += 1
+            expected = 'first'
+        elif char == ']' and expected in ('first', ','):
+            rest = buffer[position + 1:]
+            while rest or not eof:
+                if rest.strip():
+                    raise CommandError(
+                        "Ошибка в JSON-файле: данные после конца массива."
+                    )
+                rest = data.read(JSON_CHUNK_SIZE)
+                eof = not rest
+            return
+        elif expected == ',':
+            if char != ',':
+                raise CommandError(
+                    f"Ошибка в JSON-файле: ожидалась запятая, а не {char!r}."
+                )
+            position += 1
+            expected = 'value'
+        else:
+            try:
+                row, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as error:
+                if eof:
+                    raise CommandError(f"Ошибка в JSON-файле: {error}.")
+                end = len(buffer)
+            if end == len(buffer) and not eof:
+                # Объект мог оборваться на границе куска — дочитываем.
+                chunk = data.read(JSON_CHUNK_SIZE)
+                eof = not chunk
+                buffer, position = buffer[position:] + chunk, 0
+                continue
+            yield row
+            position = end
+            expected = ','
+
+
+def read_rows(path):
+    """Построчно читает CSV или JSON-массив объектов."""
+    with open(path, 'r', encoding='utf-8') as data:
+        if path.suffix == '.csv':
+            yield from csv.DictReader(data)
+        elif path.suffix == '.json':
+            yield from iter_json_array(data)
+        else:
+            raise CommandError(f"Неизвестный формат файла {path.name}.")
+
+
+def batched(rows, batch_size):
+    rows = iter(rows)
+    while batch := list(islice(rows, batch_size)):
+        yield batch
 
 
 class Command(BaseCommand):
+    help = ("Загружает ингредиенты и теги, а по запросу — примеры "
+            "рецептов. Повторный запуск не создает дубликатов.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'datasets',
+            nargs='*',
+            help=(f"Что загружать: {', '.join(DATASETS)}; по умолчанию — "
+                  f"{', '.join(DEFAULT_DATASETS)}. Примеры рецептов "
+                  f"(вместе с их автором) загружаются, только "
+                  f"если recipes указан явно."),
+        )
+        parser.add_argument(
+            '--data-dir',
+            type=Path,
+            default=Path(settings.BASE_DIR) / 'data',
+        )
+        parser.add_argument(
+            '--ingredients-file',
+            help="Файл ингредиентов (.csv или .json) внутри --data-dir.",
+            default='ingredients.csv',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+        )
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help="Не использовать COPY даже на PostgreSQL.",
+        )
+
     def handle(self, *args, **options):
-        try:
-            for model, csvfile in DATA.items():
-                with open(
-                    f'{settings.BASE_DIR}/data/{csvfile}',
-                    'r', encoding='utf-8',
-                ) as data:
-                    reader = csv.DictReader(data)
-                    model.objects.bulk_create(model(**row) for row in reader)
-        except FileNotFoundError:
-            raise CommandError(f"Файл {csvfile} не найден.")
-        self.stdout.write(self.style.SUCCESS(
-            "Данные загружены успешно.")
-        )
-
-        commands = StringIO()
-        for app in apps.get_app_configs():
-            call_command(
-                'sqlsequencereset', app.label, stdout=commands, no_color=True
+        self.data_dir = options['data_dir']
+        self.batch_size = options['batch_size']
+        self.use_copy = (
+            connection.vendor == 'postgresql' and not options['no_copy']
+        )
+        datasets = options['datasets'] or DEFAULT_DATASETS
+        unknown = set(datasets) - set(DATASETS)
+        if unknown:
+            raise CommandError(
+                f"Неизвестные наборы данных: {', '.join(sorted(unknown))}."
             )
+        if 'ingredients' in datasets:
+            self.load_ingredients(options['ingredients_file'])
+        if 'tags' in datasets:
+            self.load_tags()
+        if 'recipes' in datasets:
+            self.load_recipes()
+        bump_cache_version(INGREDIENTS_CACHE_NAME)
+        ingredient_index.invalidate()
+        bump_cache_version(TAGS_CACHE_NAME)
+        bump_cache_version(RECIPES_CACHE_NAME)
+        self.stdout.write(self.style.SUCCESS("Данные загружены успешно."))
+
+    def get_path(self, filename):
+        path = self.data_dir / filename
+        if not path.exists():
+            raise CommandError(f"Файл {filename} не найден.")
+        return path
+
+    def report(self, label, rows, started):
+        elapsed = perf_counter() - started
+        self.stdout.write(
+            f"{label}: {rows} строк, {rows / max(elapsed, 1e-9):.0f} строк/с"
+        )
+
+    def load_batches(self, label, model, rows, insert_batch):
+        before = model.objects.count()
+        started = perf_counter()
+        processed = 0
+        for batch in batched(rows, self.batch_size):
+            with transaction.atomic():
+                insert_batch(batch)
+            processed += len(batch)
+            self.report(label, processed, started)
+        created = model.objects.count() - before
+        self.stdout.write(
+            f"{label}: добавлено {created}, "
+            f"уже было {processed - created}"
+        )
+
+    def load_ingredients(self, filename):
+        fields = ('name', 'measurement_unit')
+        rows = (
+            tuple(row[field].strip() for field in fields)
+            for row in read_rows(self.get_path(filename))
+        )
+        insert_batch = (
+            self.copy_ingredients if self.use_copy
+            else self.insert_ingredients
+        )
+        self.load_batches('ingredients', Ingredient, rows, insert_batch)
+
+    def insert_ingredients(self, batch):
+        Ingredient.objects.bulk_create(
+            (
+                Ingredient(name=name, measurement_unit=measurement_unit)
+                for name, measurement_unit in batch
+            ),
+            ignore_conflicts=True,
+        )
+
+    def copy_ingredients(self, batch):
+        buffer = StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+        table = Ingredient._meta.db_table
         with connection.cursor() as cursor:
-            cursor.execute(commands.getvalue())
+            cursor.execute(
+                'CREATE TEMP TABLE ingredient_import '
+                '(name varchar, measurement_unit varchar) ON COMMIT DROP'
+            )
+            cursor.copy_expert(
+                'COPY ingredient_import (name, measurement_unit) '
+                'FROM STDIN WITH (FORMAT csv)',
+                buffer,
+            )
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT DISTINCT name, measurement_unit '
+                'FROM ingredient_import '
+                'ON CONFLICT (name, measurement_unit) DO NOTHING'
+            )
+
+    def load_tags(self):
+        self.load_batches(
+            'tags',
+            Tag,
+            read_rows(self.get_path('tags.json')),
+            self.insert_tags,
+        )
+
+    def insert_tags(self, batch):
+        Tag.objects.bulk_create(
+            (Tag(**row) for row in batch), ignore_conflicts=True,
+        )
+
+    def load_recipes(self):
+        self.load_batches(
+            'recipes',
+            Recipe,
+            read_rows(self.get_path('recipes.json')),
+            self.create_recipes,
+        )
+
+    def create_recipes(self, batch):
+        for row in batch:
+            self.create_recipe(row)
+
+    def create_recipe(self, row):
+        author_data = row['author']
+        author, _ = User.objects.get_or_create(
+            email=author_data['email'],
+            defaults={
+                'username': author_data['username'],
+                'first_name': author_data['first_name'],
+                'last_name': author_data['last_name'],
+            },
+        )
+        if Recipe.objects.filter(author=author, name=row['name']).exists():
+            return
+        recipe = Recipe(
+            author=author,
+            name=row['name'],
+            text=row['text'],
+            cooking_time=row['cooking_time'],
+        )
+        content, extension = self.get_image(row.get('image'))
+        recipe.image.save(
+            f'image.{extension}', ContentFile(content), save=False
+        )
+        recipe.save()
+        recipe.tags.set(Tag.objects.filter(slug__in=row['tags']))
+        ingredients = {
+            (ingredient.name, ingredient.measurement_unit): ingredient
+            for ingredient in Ingredient.objects.filter(
+                name__in=[item['name'] for item in row['ingredients']]
+            )
+        }
+        missing = [
+            item['name'] for item in row['ingredients']
+            if (item['name'], item['measurement_unit']) not in ingredients
+        ]
+        if missing:
+            raise CommandError(
+                f"Рецепт '{row['name']}': нет ингредиентов "
+                f"{', '.join(missing)}. Сначала загрузите ингредиенты."
+            )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=ingredients[
+                    (item['name'], item['measurement_unit'])
+                ],
+                amount=item['amount'],
+            )
+            for item in row['ingredients']
+        )
+        schedule_renditions(recipe)
+
+    def get_image(self, filename):
+        if filename:
+            path = self.get_path(filename)
+            return path.read_bytes(), path.suffix[1:].lower()
+        buffer = BytesIO()
+        Image.new('RGB', PLACEHOLDER_SIZE, PLACEHOLDER_COLOR).save(
+            buffer, 'PNG'
+        )
+        return buffer.getvalue(), 'png'
@@ -0,0 +1,19 @@
+from django.core.management import BaseCommand
+
+from core.constants import FEED_BACKFILL_RECIPES
+from recipes.feed import backfill_unpopular
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ("Дописывает в ленты подписчиков последние рецепты авторов, "
+            "которые раскладываются по лентам. Нужна после отписок от "
+            "популярных авторов: в запросе дописываются только несколько "
+            "последних рецептов.")
+
+    def handle(self, *args, **options):
+        backfill_unpopular(
+            User.objects.filter(followers_count__gt=0).values('pk'),
+            recipes=FEED_BACKFILL_RECIPES,
+        )
+        self.stdout.write(self.style.SUCCESS("Ленты дописаны."))
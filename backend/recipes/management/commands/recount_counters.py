@@ -0,0 +1,46 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from recipes.counters import COUNTERS, count_subquery
+
+
+class Command(BaseCommand):
+    help = ("Пересчитывает счетчики избранного, списков покупок, рецептов "
+            "и подписчиков и сообщает о расхождениях.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Только сообщить о расхождениях, ничего не исправляя.",
+        )
+
+    def handle(self, *args, **options):
+        total_drift = 0
+        for model, field, counted_model, relation in COUNTERS:
+            actual = count_subquery(counted_model, relation)
+            drifted = model.objects.annotate(
+                actual=actual
+            ).exclude(**{field: F('actual')})
+            drift = drifted.count()
+            total_drift += drift
+            self.stdout.write(
+                f"{model.__name__}.{field}: расхождений {drift}"
+            )
+            if drift and not options['dry_run']:
+                with transaction.atomic():
+                    model.objects.filter(
+                        pk__in=drifted.values('pk')
+                    ).update(**{field: actual})
+
+        if not total_drift:
+            self.stdout.write(self.style.SUCCESS("Счетчики совпадают."))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                f"Найдено расхождений: {total_drift}."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Исправлено расхождений: {total_drift}."
+            ))
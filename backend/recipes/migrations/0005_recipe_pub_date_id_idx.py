@@ -0,0 +1,23 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:48
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_auto_20231020_2250'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tag',
+            name='color',
+            field=models.CharField(max_length=7, unique=True, validators=[django.core.validators.RegexValidator(message="Поле color должно содержать латинские буквы 'a-f/A-F' и/или цифры, начинаться с символа '#' и содержать 3 или 6 символов после '#'.", regex='^#([0-9a-fA-F]{3}){1,2}\\Z')], verbose_name='HEX-цвет тега'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date', '-id'], name='recipe_pub_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:50
+
+from django.db import migrations, models
+import recipes.images
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_renditions_ready',
+            field=models.BooleanField(default=False, editable=False, verbose_name='уменьшенные копии картинки готовы'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(storage=recipes.images.ContentAddressedStorage(), upload_to='recipes/', verbose_name='картинка рецепта'),
+        ),
+    ]
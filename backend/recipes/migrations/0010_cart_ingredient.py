@@ -0,0 +1,59 @@
+# Generated by Django 3.2.16 on 2026-10-18 19:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+CART_BATCH_SIZE = 1000
+
+
+def fill_carts(apps, schema_editor):
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    CartIngredient = apps.get_model('recipes', 'CartIngredient')
+    totals = ShoppingCart.objects.filter(
+        recipe__ingredients__isnull=False,
+    ).values(
+        'user_id', 'recipe__ingredients__ingredient_id',
+    ).annotate(
+        amount=models.Sum('recipe__ingredients__amount'),
+    ).order_by()
+    CartIngredient.objects.bulk_create(
+        (
+            CartIngredient(
+                user_id=total['user_id'],
+                ingredient_id=total['recipe__ingredients__ingredient_id'],
+                amount=total['amount'],
+            )
+            for total in totals.iterator()
+        ),
+        batch_size=CART_BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0009_feed_entry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CartIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(verbose_name='количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.ingredient', verbose_name='ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='пользователь')),
+            ],
+            options={
+                'verbose_name': 'ингредиент списка покупок',
+                'verbose_name_plural': 'ингредиенты списков покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='cartingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_cart_ingredient'),
+        ),
+        migrations.RunPython(fill_carts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.16 on 2026-10-18 19:35
+
+from django.db import migrations
+import recipes.images
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_cart_ingredient'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=recipes.images.ContentAddressedImageField(storage=recipes.images.ContentAddressedStorage(), upload_to='recipes/', verbose_name='картинка рецепта'),
+        ),
+    ]
@@ -1,9 +1,12 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
 
 from core.constants import MAX_RECIPE_VALUE_LENGTH, MAX_TAG_COLOR_LENGTH
+from core.deletion import CascadeDeleteMixin, CascadeDeleteQuerySet
 from core.validators import name_validator, tag_color_validator
 from users.models import User
+from .images import ContentAddressedImageField
 
 
 class Tag(models.Model):
@@ -60,7 +63,14 @@ class Ingredient(models.Model):
         return f'{self.name}, {self.measurement_unit}'
 
 
-class Recipe(models.Model):
+class RecipeManager(models.Manager.from_queryset(CascadeDeleteQuerySet)):
+    """Поисковый вектор нужен только в WHERE, в выборку он не попадает."""
+
+    def get_queryset(self):
+        return super().get_queryset().defer('search_vector')
+
+
+class Recipe(CascadeDeleteMixin, models.Model):
     name = models.CharField(
         verbose_name='название рецепта',
         max_length=MAX_RECIPE_VALUE_LENGTH,
@@ -89,15 +99,47 @@ class Recipe(models.Model):
             message="Время приготовления не может быть менее 1 минуты.",
         )],
     )
-    image = models.ImageField(
+    image = ContentAddressedImageField(
         verbose_name='картинка рецепта',
         upload_to='recipes/',
     )
+    image_renditions_ready = models.BooleanField(
+        verbose_name='уменьшенные копии картинки готовы',
+        default=False,
+        editable=False,
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='добавлений в избранное',
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='добавлений в список покупок',
+        default=0,
+        editable=False,
+    )
+    search_vector = SearchVectorField(
+        verbose_name='поисковый вектор',
+        null=True,
+        editable=False,
+    )
+
+    objects = RecipeManager()
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'рецепт'
         verbose_name_plural = 'рецепты'
+        indexes = (
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx',
+            ),
+        )
 
     def __str__(self):
         return self.name
@@ -194,3 +236,84 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.user.username}: {self.recipe.name}'
+
+
+class CartIngredient(models.Model):
+    """
+    Сумма ингредиента по всем рецептам в списке покупок пользователя.
+    Поддерживается вместе с ShoppingCart и составом рецептов,
+    см. recipes.shopping_cart.
+    """
+    user = models.ForeignKey(
+        User,
+        verbose_name='пользователь',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name='ингредиент',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    amount = models.PositiveIntegerField(
+        verbose_name='количество',
+    )
+
+    class Meta:
+        verbose_name = 'ингредиент списка покупок'
+        verbose_name_plural = 'ингредиенты списков покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_cart_ingredient',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user.username}: {self.ingredient.name}, {self.amount}'
+
+
+class FeedEntry(models.Model):
+    """
+    Строка ленты: рецепт автора, на которого подписан пользователь.
+    Заполняется при публикации рецепта (fan-out on write),
+    см. recipes.feed.
+    """
+    user = models.ForeignKey(
+        User,
+        verbose_name='читатель ленты',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='рецепт',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    author = models.ForeignKey(
+        User,
+        verbose_name='автор рецепта',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+
+    class Meta:
+        verbose_name = 'запись ленты'
+        verbose_name_plural = 'записи ленты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=['user', 'author'],
+                name='feed_entry_user_author_idx',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user.username}: {self.recipe.name}'
@@ -0,0 +1,39 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import Case, F, IntegerField, Q, Value, When
+
+from core.constants import SEARCH_CONFIG
+
+
+def search_recipes(queryset, text):
+    """
+    Полнотекстовый поиск по названию и описанию рецепта,
+    результаты упорядочены по релевантности.
+
+    В PostgreSQL запрос идет по колонке search_vector с GIN-индексом,
+    которую поддерживает триггер (миграция 0008). На других СУБД —
+    поиск по подстрокам: рецепт должен содержать все слова запроса,
+    выше стоят рецепты, у которых слова встречаются в названии.
+    """
+    text = text.strip()
+    if not text:
+        return queryset
+    if connections[queryset.db].vendor == 'postgresql':
+        query = SearchQuery(text, config=SEARCH_CONFIG,
+                            search_type='websearch')
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query),
+        ).order_by('-rank', '-pub_date', '-id')
+    words = text.split()
+    for word in words:
+        queryset = queryset.filter(
+            Q(name__icontains=word) | Q(text__icontains=word)
+        )
+    rank = Value(0)
+    for word in words:
+        rank += Case(
+            When(name__icontains=word, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    return queryset.annotate(rank=rank).order_by('-rank', '-pub_date', '-id')
@@ -1,22 +1,53 @@
 from django.db import transaction
+from django.db.models import prefetch_related_objects
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
-from rest_framework.validators import UniqueTogetherValidator
 
+from core.constants import MAX_BATCH_RECIPES
 from users.serializers import UserSerializer
-from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                     ShoppingCart, Tag)
+from .images import get_rendition_urls, schedule_renditions
+from .models import (CartIngredient, Favorite, Ingredient, Recipe,
+                     RecipeIngredient, ShoppingCart, Tag)
+from .shopping_cart import change_recipe_in_carts
+
+
+class ImageRenditionsField(serializers.Field):
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        urls = get_rendition_urls(
+            recipe.image, recipe.image_renditions_ready
+        )
+        request = self.context.get('request')
+        if urls and request is not None:
+            urls = {
+                key: request.build_absolute_uri(url)
+                for key, url in urls.items()
+            }
+        return urls
 
 
 class RecipeShortSerializer(serializers.ModelSerializer):
+    image_renditions = ImageRenditionsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time',)
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time',)
+
+
+def get_recipes_limit(request):
+    try:
+        return int(request.query_params.get('recipes_limit', 0))
+    except ValueError:
+        return 0
 
 
 class UserSubscribeSerializer(UserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.ReadOnlyField(source='recipes.count')
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta(UserSerializer.Meta):
         fields = UserSerializer.Meta.fields + (
@@ -24,11 +55,7 @@ class UserSubscribeSerializer(UserSerializer):
         )
 
     def get_recipes(self, obj):
-        request = self.context['request']
-        try:
-            recipes_limit = int(request.query_params.get('recipes_limit', 0))
-        except ValueError:
-            recipes_limit = 0
+        recipes_limit = get_recipes_limit(self.context['request'])
         queryset = obj.recipes.all()
         if recipes_limit > 0:
             queryset = queryset[:recipes_limit]
@@ -61,6 +88,19 @@ class RecipeIngredientReadSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount',)
 
 
+class CartIngredientSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(read_only=True, source='ingredient.id')
+    name = serializers.CharField(read_only=True, source='ingredient.name')
+    measurement_unit = serializers.CharField(
+        read_only=True,
+        source='ingredient.measurement_unit',
+    )
+
+    class Meta:
+        model = CartIngredient
+        fields = ('id', 'name', 'measurement_unit', 'amount',)
+
+
 class RecipeReadSerializer(serializers.ModelSerializer):
     tags = TagSerializer(many=True, read_only=True)
     author = UserSerializer(read_only=True)
@@ -69,6 +109,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         read_only=True,
     )
     image = Base64ImageField(use_url=True, max_length=None)
+    image_renditions = ImageRenditionsField()
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
 
@@ -83,17 +124,22 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_renditions',
             'text',
             'cooking_time',
         )
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context['request']
         return request.user.is_authenticated and (
             request.user.favorited_by.filter(recipe=obj).exists()
         )
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context['request']
         return request.user.is_authenticated and (
             request.user.in_shopping_cart_of.filter(recipe=obj).exists()
@@ -101,9 +147,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
 
 
 class RecipeIngredientCreateUpdateSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(),
-    )
+    id = serializers.IntegerField()
 
     class Meta:
         model = RecipeIngredient
@@ -143,6 +187,14 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 "Ингредиенты не могут повторяться."
             )
+        missing = set(ingredients_list) - set(
+            Ingredient.objects.in_bulk(ingredients_list)
+        )
+        if missing:
+            raise serializers.ValidationError(
+                "Ингредиенты не найдены: "
+                f"{', '.join(str(pk) for pk in sorted(missing))}."
+            )
         return ingredients
 
     def validate_tags(self, tags):
@@ -161,12 +213,54 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         RecipeIngredient.objects.bulk_create(
             RecipeIngredient(
                 recipe=recipe,
-                ingredient=ingredient['id'],
+                ingredient_id=ingredient['id'],
                 amount=ingredient['amount'],
             )
             for ingredient in ingredients
         )
 
+    def update_ingredients(self, recipe, ingredients):
+        """
+        Применяет к рецепту только разницу: удаляет убранные ингредиенты,
+        обновляет изменившиеся количества и добавляет новые.
+        """
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in recipe.ingredients.all()
+        }
+        amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        removed = current.keys() - amounts.keys()
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        # Изменения количеств для сумм списков покупок с этим рецептом.
+        cart_amounts = {
+            ingredient_id: -current[ingredient_id].amount
+            for ingredient_id in removed
+        }
+        changed = []
+        for ingredient_id, recipe_ingredient in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and amount != recipe_ingredient.amount:
+                cart_amounts[ingredient_id] = amount - recipe_ingredient.amount
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        added = [
+            ingredient for ingredient in ingredients
+            if ingredient['id'] not in current
+        ]
+        self.add_ingredients(recipe, added)
+        cart_amounts.update(
+            (ingredient['id'], ingredient['amount']) for ingredient in added
+        )
+        change_recipe_in_carts(recipe.pk, cart_amounts)
+
     @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
@@ -174,6 +268,7 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(**validated_data)
         self.add_ingredients(recipe, ingredients)
         recipe.tags.set(tags)
+        schedule_renditions(recipe)
         return recipe
 
     @transaction.atomic
@@ -189,61 +284,51 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
                 "Поле 'tags' обязательно для обновления."
             )
         if ingredients:
-            RecipeIngredient.objects.select_related(
-                'recipe', 'ingredients'
-            ).filter(recipe=recipe).delete()
-            self.add_ingredients(recipe, ingredients)
+            self.update_ingredients(recipe, ingredients)
         if tags:
             recipe.tags.set(tags)
+        image_changed = 'image' in validated_data
+        if image_changed:
+            validated_data['image_renditions_ready'] = False
         recipe = super().update(recipe, validated_data)
-        recipe.save()
+        if image_changed:
+            schedule_renditions(recipe)
         return recipe
 
     def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance], 'ingredients__ingredient', 'tags'
+        )
         context = {'request': self.context['request']}
         return RecipeReadSerializer(instance, context=context).data
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BATCH_RECIPES,
+    )
+
+
 class AbstractFavoriteShoppingCartSerializer(serializers.ModelSerializer):
     class Meta:
         fields = ('user', 'recipe',)
 
-    def validate(self, data):
-        if self.Meta.model.objects.filter(user=data['user'],
-                                          recipe=data['recipe']).exists():
-            raise serializers.ValidationError(
-                "Этот рецепт уже был добавлен ранее."
-            )
-        if not data['recipe'] and (
-            self.context['request'].method == 'DELETE'
-        ):
-            raise serializers.ValidationError("Этот рецепт не был добавлен.")
-        return data
-
     def to_representation(self, instance):
         context = {'request': self.context['request']}
         return RecipeShortSerializer(instance.recipe, context=context).data
 
 
 class FavoriteSerializer(AbstractFavoriteShoppingCartSerializer):
+    already_added_message = "Этот рецепт уже есть в Избранном."
+
     class Meta(AbstractFavoriteShoppingCartSerializer.Meta):
         model = Favorite
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Favorite.objects.all(),
-                fields=('user', 'recipe',),
-                message="Этот рецепт уже есть в Избранном.",
-            ),
-        ]
 
 
 class ShoppingCartSerializer(AbstractFavoriteShoppingCartSerializer):
+    already_added_message = "Этот рецепт уже есть в Списке покупок."
+
     class Meta(AbstractFavoriteShoppingCartSerializer.Meta):
         model = ShoppingCart
-        validators = [
-            UniqueTogetherValidator(
-                queryset=ShoppingCart.objects.all(),
-                fields=('user', 'recipe',),
-                message="Этот рецепт уже есть в Списке покупок.",
-            ),
-        ]
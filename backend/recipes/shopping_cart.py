@@ -0,0 +1,252 @@
+import csv
+import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import (Case, Exists, F, OuterRef, Subquery, Sum, Value,
+                              When)
+from django.db.models.functions import Coalesce, Greatest
+
+from core.constants import SHOPPING_CART_CHUNK_SIZE
+from users.models import User
+from .models import CartIngredient, RecipeIngredient, ShoppingCart
+
+# Суммы ингредиентов списка покупок хранятся в CartIngredient и меняются
+# в той же транзакции, что и список: при добавлении и удалении рецептов
+# (change_cart) и при правке состава рецепта (change_recipe_in_carts).
+# Выгрузка читает готовые суммы, а не соединение четырех таблиц.
+# Каждое изменение сумм увеличивает User.cart_version, из которой
+# строится ETag выгрузки.
+
+CONTENT_TYPES = {
+    'txt': 'text/plain; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+    'json': 'application/json',
+}
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def get_cart_totals(user_ids):
+    """Суммы ингредиентов списков покупок, посчитанные по рецептам."""
+    return ShoppingCart.objects.filter(
+        user_id__in=user_ids,
+        recipe__ingredients__isnull=False,
+    ).values_list(
+        'user_id', 'recipe__ingredients__ingredient_id',
+    ).annotate(
+        amount=Sum('recipe__ingredients__amount')
+    ).order_by()
+
+
+locked_users = ContextVar('locked_users', default=frozenset())
+
+
+def lock_users(user_ids):
+    """
+    Блокирует строки пользователей: параллельные изменения одного списка
+    покупок или избранного выполняются по очереди, не теряют обновлений
+    сумм и не сдвигают счетчики дважды за одну строку. Пользователи,
+    уже заблокированные в locking_users, повторно не блокируются.
+    """
+    user_ids = set(user_ids) - locked_users.get()
+    if not user_ids:
+        return
+    list(User.objects.select_for_update().filter(
+        pk__in=user_ids
+    ).order_by('pk').values_list('pk', flat=True))
+
+
+def bump_cart_versions(user_ids):
+    """
+    Увеличивает версии списков покупок. Строки пользователей сначала
+    блокируются по порядку id (lock_users), чтобы параллельные изменения
+    нескольких списков не блокировали друг друга крест-накрест.
+    """
+    lock_users(user_ids)
+    User.objects.filter(pk__in=user_ids).update(
+        cart_version=F('cart_version') + 1
+    )
+
+
+@contextmanager
+def locking_users(user_ids):
+    """Транзакция, в которой пользователи user_ids заблокированы."""
+    with transaction.atomic():
+        lock_users(user_ids)
+        token = locked_users.set(locked_users.get() | frozenset(user_ids))
+        try:
+            yield
+        finally:
+            locked_users.reset(token)
+
+
+@transaction.atomic(savepoint=False)
+def change_cart_totals(user_ids, amounts):
+    """
+    Прибавляет к суммам списков покупок пользователей user_ids изменения
+    amounts ({id ингредиента: изменение}). Обнулившиеся строки удаляются.
+    """
+    amounts = {pk: amount for pk, amount in amounts.items() if amount}
+    if not user_ids or not amounts:
+        return
+    bump_cart_versions(user_ids)
+    totals = CartIngredient.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=amounts
+    )
+    totals.update(amount=Greatest(
+        F('amount') + Case(
+            *(When(ingredient_id=pk, then=Value(amount))
+              for pk, amount in amounts.items()),
+            default=Value(0),
+        ),
+        Value(0),
+    ))
+    # Существующие строки уже обновлены выше и пропускаются.
+    CartIngredient.objects.bulk_create(
+        (
+            CartIngredient(user_id=user_id, ingredient_id=pk, amount=amount)
+            for user_id in user_ids
+            for pk, amount in amounts.items()
+            if amount > 0
+        ),
+        ignore_conflicts=True,
+    )
+    if min(amounts.values()) < 0:
+        totals.filter(amount=0).delete()
+
+
+def change_cart(user_id, recipe_ids, sign):
+    """Добавление (sign=1) или удаление (sign=-1) рецептов из списка."""
+    amounts = RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('ingredient_id').annotate(
+        amount=Sum('amount')
+    ).order_by()
+    change_cart_totals(
+        [user_id], {pk: sign * amount for pk, amount in amounts}
+    )
+
+
+def change_recipe_in_carts(recipe_id, amounts):
+    """Изменение состава рецепта — во все списки покупок с этим рецептом."""
+    if not any(amounts.values()):
+        return
+    user_ids = ShoppingCart.objects.filter(
+        recipe_id=recipe_id
+    ).order_by('user_id').values_list('user_id', flat=True).iterator()
+    while batch := list(islice(user_ids, SHOPPING_CART_CHUNK_SIZE)):
+        change_cart_totals(batch, amounts)
+
+
+def remove_recipes_from_carts(recipe_ids, exclude_user_ids=()):
+    """
+    Вычитает удаляемые рецепты из всех списков покупок, где они есть:
+    два запроса на все списки, а не по три на каждую строку ShoppingCart.
+    Списки пользователей exclude_user_ids удаляются вместе с ними.
+    """
+    user_ids = ShoppingCart.objects.filter(
+        recipe_id__in=recipe_ids
+    ).exclude(user_id__in=exclude_user_ids).values('user_id')
+    bump_cart_versions(set(user_ids.values_list('user_id', flat=True)))
+    removed = RecipeIngredient.objects.filter(
+        Exists(ShoppingCart.objects.filter(
+            user_id=OuterRef(OuterRef('user_id')),
+            recipe_id=OuterRef('recipe_id'),
+        )),
+        recipe_id__in=recipe_ids,
+        ingredient_id=OuterRef('ingredient_id'),
+    ).order_by().values('ingredient_id').annotate(
+        amount=Sum('amount')
+    ).values('amount')
+    totals = CartIngredient.objects.filter(
+        user_id__in=user_ids,
+        ingredient_id__in=RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values('ingredient_id'),
+    )
+    totals.update(amount=Greatest(
+        F('amount') - Coalesce(Subquery(removed), 0), Value(0)
+    ))
+    totals.filter(amount=0).delete()
+
+
+@transaction.atomic(savepoint=False)
+def rebuild_carts(user_ids):
+    """Пересчитывает суммы списков покупок пользователей с нуля."""
+    bump_cart_versions(user_ids)
+    CartIngredient.objects.filter(user_id__in=user_ids).delete()
+    CartIngredient.objects.bulk_create(
+        (
+            CartIngredient(user_id=user_id, ingredient_id=pk, amount=amount)
+            for user_id, pk, amount in get_cart_totals(user_ids)
+        ),
+        batch_size=SHOPPING_CART_CHUNK_SIZE,
+    )
+
+
+def get_cart_ingredients(user):
+    return CartIngredient.objects.filter(
+        user=user
+    ).values_list(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        'amount',
+    ).order_by(
+        'ingredient__name'
+    ).iterator(chunk_size=SHOPPING_CART_CHUNK_SIZE)
+
+
+def get_cart_etag(user, file_format):
+    """
+    ETag списка покупок: версия списка, которую увеличивает каждое
+    изменение сумм и названий ингредиентов в нем. Читается одна строка
+    пользователя, а не весь список.
+    """
+    version = User.objects.filter(pk=user.pk).values_list(
+        'cart_version', flat=True
+    ).get()
+    return f'"{user.pk}-{version}-{file_format}"'
+
+
+def render_txt(ingredients):
+    yield 'Список покупок\n\n'
+    for name, measurement_unit, amount in ingredients:
+        yield f'{name}: {amount} {measurement_unit}\n'
+
+
+def render_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for row in ingredients:
+        yield writer.writerow(row)
+
+
+def render_json(ingredients):
+    yield '['
+    separator = ''
+    for name, measurement_unit, amount in ingredients:
+        yield separator + json.dumps(
+            {
+                'name': name,
+                'measurement_unit': measurement_unit,
+                'amount': amount,
+            },
+            ensure_ascii=False,
+        )
+        separator = ','
+    yield ']'
+
+
+RENDERERS = {
+    'txt': render_txt,
+    'csv': render_csv,
+    'json': render_json,
+}
@@ -0,0 +1,160 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from core.cache import bump_cache_version
+from core.constants import (INGREDIENTS_CACHE_NAME, RECIPES_CACHE_NAME,
+                            TAGS_CACHE_NAME)
+from core.deletion import (cascade_delete, get_deleting, in_cascade,
+                           mark_deleting)
+from users.models import Subscribe, User
+from .counters import COUNTERS, change_counters, remove_counted
+from .feed import (backfill_unpopular, fan_out, get_popular_authors,
+                   on_subscribe, on_unsubscribe)
+from .ingredient_index import ingredient_index
+from .models import (CartIngredient, Favorite, Ingredient, Recipe,
+                     RecipeIngredient, ShoppingCart, Tag)
+from .shopping_cart import (bump_cart_versions, change_cart,
+                            remove_recipes_from_carts)
+
+
+def bump_on_commit(*names):
+    for name in names:
+        transaction.on_commit(partial(bump_cache_version, name))
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def bump_tags_version(sender, **kwargs):
+    bump_on_commit(TAGS_CACHE_NAME, RECIPES_CACHE_NAME)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_ingredients_version(sender, **kwargs):
+    bump_on_commit(INGREDIENTS_CACHE_NAME, RECIPES_CACHE_NAME)
+    transaction.on_commit(ingredient_index.invalidate)
+
+
+@receiver((post_save, pre_delete), sender=Ingredient)
+def bump_cart_versions_on_ingredient_change(sender, instance, created=False,
+                                            **kwargs):
+    """Название и единица ингредиента попадают в выгрузку списка."""
+    if not created:
+        bump_cart_versions(CartIngredient.objects.filter(
+            ingredient=instance
+        ).values_list('user_id', flat=True))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_recipes_version(sender, **kwargs):
+    bump_on_commit(RECIPES_CACHE_NAME)
+
+
+@receiver((post_save, post_delete), sender=User)
+def bump_recipes_version_on_author_change(sender, update_fields=None,
+                                          **kwargs):
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    bump_on_commit(RECIPES_CACHE_NAME)
+
+
+def update_counter(sender, instance, delta):
+    for _, _, counted_model, relation in COUNTERS:
+        if counted_model is sender:
+            change_counters(
+                sender, [getattr(instance, f'{relation}_id')], delta
+            )
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscribe)
+@receiver(post_save, sender=Recipe)
+def increment_counter(sender, instance, created, **kwargs):
+    if created:
+        update_counter(sender, instance, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscribe)
+@receiver(post_delete, sender=Recipe)
+def decrement_counter(sender, instance, **kwargs):
+    if not in_cascade(instance):
+        update_counter(sender, instance, -1)
+
+
+@receiver(post_save, sender=Recipe)
+def add_recipe_to_feeds(sender, instance, created, **kwargs):
+    if created:
+        fan_out(instance)
+
+
+@receiver(post_save, sender=Subscribe)
+def add_author_to_feed(sender, instance, created, **kwargs):
+    if created:
+        on_subscribe(instance.user_id, instance.subscribing_id)
+
+
+@receiver(post_delete, sender=Subscribe)
+def remove_author_from_feed(sender, instance, **kwargs):
+    if not in_cascade(instance):
+        on_unsubscribe(instance.user_id, instance.subscribing_id)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_recipe_to_cart_totals(sender, instance, created, **kwargs):
+    if created:
+        change_cart(instance.user_id, [instance.recipe_id], 1)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_recipe_from_cart_totals(sender, instance, **kwargs):
+    """
+    pre_delete, а не post_delete: к post_delete ингредиенты рецепта уже
+    могут быть удалены. Каскад от рецепта или пользователя обрабатывает
+    remove_deleted_recipes.
+    """
+    if not in_cascade(instance):
+        change_cart(instance.user_id, [instance.recipe_id], -1)
+
+
+@receiver(cascade_delete, sender=Recipe)
+def remove_deleted_recipes(sender, pks, **kwargs):
+    """
+    Удаление рецептов: суммы чужих списков покупок и счетчики рецептов
+    авторов сдвигаются одним запросом на все рецепты.
+    """
+    remove_recipes_from_carts(pks, exclude_user_ids=get_deleting(User))
+    remove_counted(Recipe, Recipe.objects.filter(pk__in=pks))
+
+
+@receiver(cascade_delete, sender=User)
+def remove_deleted_users(sender, pks, **kwargs):
+    """
+    Удаление пользователей вместе с их рецептами, избранным, списками
+    покупок и подписками. Счетчики остальных пользователей и рецептов
+    сдвигаются одним запросом на связь; суммы списков покупок удаляемых
+    пользователей не пересчитываются — они удаляются каскадом.
+    """
+    recipe_ids = list(Recipe.objects.filter(
+        author_id__in=pks
+    ).values_list('pk', flat=True))
+    mark_deleting(Recipe, recipe_ids)
+    if recipe_ids:
+        remove_deleted_recipes(Recipe, recipe_ids)
+    for model in (Favorite, ShoppingCart):
+        remove_counted(model, model.objects.filter(
+            Q(user_id__in=pks) | Q(recipe_id__in=recipe_ids)
+        ))
+    subscriptions = Subscribe.objects.filter(
+        Q(user_id__in=pks) | Q(subscribing_id__in=pks)
+    )
+    popular = get_popular_authors(subscriptions.values('subscribing_id'))
+    remove_counted(Subscribe, subscriptions)
+    backfill_unpopular(popular, exclude_user_ids=pks)
@@ -0,0 +1,699 @@
+import csv
+import json
+import re
+import shutil
+import tempfile
+from io import StringIO
+from threading import Thread
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.cache import bump_cache_version
+from core.constants import FEED_REQUEST_BACKFILL_RECIPES, RECIPES_CACHE_NAME
+from users.models import Subscribe, User
+from .counters import COUNTERS, count_subquery
+from .images import ContentAddressedStorage, get_content_name
+from .ingredient_index import ingredient_index
+from .management.commands import load_data
+from .management.commands.generate_data import (EMAIL_DOMAIN, PASSWORD,
+                                                TAG_SLUG_PREFIX)
+from .models import (CartIngredient, Favorite, Ingredient, Recipe,
+                     RecipeIngredient, ShoppingCart, Tag)
+from .shopping_cart import get_cart_totals
+
+PAGE_SIZES = (2, 6, 20)
+
+
+def normalize(data):
+    """
+    Порядок ингредиентов RecipeReadSerializer не задает (prefetch без
+    сортировки), поэтому при сравнении ингредиенты упорядочиваются по id.
+    """
+    if isinstance(data, dict):
+        return {
+            key: sorted(value, key=lambda item: item['id'])
+            if key == 'ingredients' else normalize(value)
+            for key, value in data.items()
+        }
+    if isinstance(data, list):
+        return [normalize(item) for item in data]
+    return data
+
+
+class GeneratedDataTestCase(TestCase):
+    """Данные generate_data; картинки рецептов — во временном каталоге."""
+    recipes = 40
+
+    @classmethod
+    def setUpClass(cls):
+        media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        overridden = override_settings(MEDIA_ROOT=media_root)
+        overridden.enable()
+        cls.addClassCleanup(overridden.disable)
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'generate_data', seed=0, recipes=cls.recipes,
+            users=max(cls.recipes // 5, 2), favorites=5, stdout=StringIO(),
+        )
+        cls.user = User.objects.get(pk=ShoppingCart.objects.filter(
+            user__email__endswith=f'@{EMAIL_DOMAIN}'
+        ).order_by('user_id').values_list('user', flat=True).first())
+        cls.token = Token.objects.create(user=cls.user)
+
+    def get_client(self, authenticated):
+        client = APIClient()
+        if authenticated:
+            client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        return client
+
+
+class RecipeListQueriesTests(GeneratedDataTestCase):
+    # (RECIPE_FAST_READ, с токеном): запросов на страницу. Сериализатор:
+    # подсчет, рецепты, ингредиенты рецептов, ингредиенты, теги; быстрое
+    # чтение соединяет ингредиенты одним запросом. Пользователю еще нужны
+    # токен и подписки на авторов. Кэш списка с LocMemCache выключен.
+    queries = {
+        (False, False): 5, (False, True): 7,
+        (True, False): 4, (True, True): 6,
+    }
+
+    def test_queries_do_not_depend_on_page_size(self):
+        for (fast_read, authenticated), queries in self.queries.items():
+            client = self.get_client(authenticated)
+            for limit in PAGE_SIZES:
+                with self.subTest(fast_read=fast_read,
+                                  authenticated=authenticated, limit=limit):
+                    with override_settings(RECIPE_FAST_READ=fast_read):
+                        with self.assertNumQueries(queries):
+                            response = client.get(
+                                f'/api/recipes/?limit={limit}'
+                            )
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(len(response.data['results']), limit)
+
+    def test_subscriptions_read_for_page_authors_only(self):
+        client = self.get_client(authenticated=True)
+        for url in ('/api/recipes/?limit=2', '/api/recipes/{}/'.format(
+            Recipe.objects.exclude(author=self.user).values_list(
+                'pk', flat=True
+            ).first()
+        )):
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as captured:
+                    response = client.get(url)
+                self.assertEqual(response.status_code, 200)
+                subscriptions = [
+                    query['sql'] for query in captured.captured_queries
+                    if 'users_subscribe' in query['sql']
+                ]
+                self.assertEqual(len(subscriptions), 1)
+                self.assertIn('"subscribing_id" IN', subscriptions[0])
+
+    def test_tags_read_once(self):
+        slugs = list(Tag.objects.values_list('slug', flat=True)[:3])
+        client = self.get_client(authenticated=False)
+        for tags, status in ((slugs, 200), (slugs + ['unknown'], 400)):
+            with self.subTest(tags=tags):
+                with CaptureQueriesContext(connection) as captured:
+                    response = client.get('/api/recipes/', {'tags': tags})
+                self.assertEqual(response.status_code, status)
+                tag_maps = [
+                    query['sql'] for query in captured.captured_queries
+                    if query['sql'].startswith(
+                        'SELECT "recipes_tag"."slug", "recipes_tag"."id"'
+                    )
+                ]
+                self.assertEqual(len(tag_maps), 1)
+
+
+class FastReadTests(GeneratedDataTestCase):
+    """Быстрое чтение отвечает так же, как RecipeReadSerializer."""
+    recipes = 120
+
+    def get_urls(self):
+        recipe = Recipe.objects.filter(
+            author__email__endswith=f'@{EMAIL_DOMAIN}'
+        ).order_by('id').first()
+        slug = Tag.objects.filter(
+            slug__startswith=TAG_SLUG_PREFIX
+        ).order_by('id').values_list('slug', flat=True).first()
+        return (
+            '/api/recipes/',
+            '/api/recipes/?limit=50',
+            '/api/recipes/?limit=50&page=2',
+            '/api/recipes/?cursor=&limit=50',
+            f'/api/recipes/?limit=50&tags={slug}',
+            f'/api/recipes/?author={recipe.author_id}',
+            '/api/recipes/?limit=50&is_favorited=1',
+            '/api/recipes/?limit=50&is_in_shopping_cart=1',
+            '/api/recipes/?limit=50&search=суп',
+            '/api/recipes/feed/?limit=50',
+            f'/api/recipes/{recipe.pk}/',
+            '/api/recipes/0/',
+        )
+
+    def test_responses_match_serializer(self):
+        for url in self.get_urls():
+            for authenticated in (False, True):
+                client = self.get_client(authenticated)
+                with self.subTest(url=url, authenticated=authenticated):
+                    responses = []
+                    for fast_read in (False, True):
+                        with override_settings(RECIPE_FAST_READ=fast_read):
+                            response = client.get(url)
+                        responses.append((
+                            response.status_code,
+                            normalize(json.loads(response.content)),
+                        ))
+                    self.assertEqual(responses[0], responses[1])
+
+
+class CartTotalsTests(GeneratedDataTestCase):
+    """
+    Суммы списков покупок и счетчики совпадают с пересчетом после
+    изменений списков, рецептов и каскадных удалений.
+    """
+    recipes = 20
+
+    def assertConsistent(self):
+        self.assertEqual(
+            set(CartIngredient.objects.values_list(
+                'user_id', 'ingredient_id', 'amount'
+            )),
+            set(get_cart_totals(User.objects.values('pk'))),
+        )
+        for model, field, counted_model, relation in COUNTERS:
+            drifted = model.objects.annotate(
+                actual=count_subquery(counted_model, relation)
+            ).exclude(**{field: F('actual')})
+            self.assertFalse(
+                drifted.values_list('pk', field, 'actual'),
+                f'{model.__name__}.{field}',
+            )
+
+    def get_recipe_ids(self, model, in_list):
+        listed = model.objects.filter(user=self.user).values('recipe')
+        recipes = Recipe.objects.order_by('id')
+        if in_list:
+            recipes = recipes.filter(pk__in=listed)
+        else:
+            recipes = recipes.exclude(pk__in=listed)
+        return list(recipes.values_list('pk', flat=True)[:3])
+
+    def test_generated_data(self):
+        self.assertConsistent()
+
+    def test_single_changes(self):
+        client = self.get_client(authenticated=True)
+        for model, url in ((ShoppingCart, 'shopping_cart'),
+                           (Favorite, 'favorite')):
+            added = self.get_recipe_ids(model, in_list=False)[0]
+            removed = self.get_recipe_ids(model, in_list=True)[0]
+            with self.subTest(model=model.__name__):
+                response = client.post(f'/api/recipes/{added}/{url}/')
+                self.assertEqual(response.status_code, 201)
+                response = client.delete(f'/api/recipes/{removed}/{url}/')
+                self.assertEqual(response.status_code, 204)
+                self.assertConsistent()
+
+    def test_batch_changes(self):
+        client = self.get_client(authenticated=True)
+        for model, url in ((ShoppingCart, 'shopping_cart'),
+                           (Favorite, 'favorite')):
+            recipes = (
+                self.get_recipe_ids(model, in_list=False)
+                + self.get_recipe_ids(model, in_list=True)
+            )
+            with self.subTest(model=model.__name__):
+                for method in ('post', 'delete'):
+                    response = getattr(client, method)(
+                        f'/api/recipes/{url}/', {'recipes': recipes},
+                        format='json',
+                    )
+                    self.assertEqual(response.status_code, 200)
+                    self.assertConsistent()
+
+    def test_recipe_update(self):
+        recipe = Recipe.objects.filter(in_carts_count__gt=0).order_by(
+            'id'
+        ).first()
+        current = recipe.ingredients.order_by('id')
+        kept = current.first()
+        added = Ingredient.objects.exclude(
+            pk__in=current.values('ingredient')
+        ).order_by('id').first()
+        client = APIClient()
+        client.force_authenticate(recipe.author)
+        response = client.patch(f'/api/recipes/{recipe.pk}/', {
+            'ingredients': [
+                {'id': kept.ingredient_id, 'amount': kept.amount + 5},
+                {'id': added.pk, 'amount': 7},
+            ],
+            'tags': list(recipe.tags.values_list('id', flat=True)),
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertConsistent()
+
+    def test_recipe_delete(self):
+        recipe = Recipe.objects.filter(
+            in_carts_count__gt=0, favorites_count__gt=0
+        ).order_by('id').first()
+        client = APIClient()
+        client.force_authenticate(recipe.author)
+        response = client.delete(f'/api/recipes/{recipe.pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertConsistent()
+
+    def test_user_delete(self):
+        # У автора есть свои списки, подписки и рецепты в чужих списках.
+        author = User.objects.filter(
+            recipes__in_carts_count__gt=0,
+            followers_count__gt=0,
+            in_shopping_cart_of__isnull=False,
+        ).order_by('id').first()
+        client = APIClient()
+        client.force_authenticate(author)
+        response = client.delete(
+            '/api/users/me/', {'current_password': PASSWORD}, format='json'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertConsistent()
+
+
+class ShoppingCartDownloadTests(GeneratedDataTestCase):
+    """Выгрузка списка покупок в разных форматах и ее ETag."""
+    recipes = 20
+    url = '/api/recipes/download_shopping_cart/'
+
+    def setUp(self):
+        self.client = self.get_client(authenticated=True)
+
+    def get_expected(self):
+        names = dict(
+            (pk, (name, measurement_unit))
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'pk', 'name', 'measurement_unit'
+            )
+        )
+        return sorted(
+            (*names[ingredient_id], amount)
+            for _, ingredient_id, amount in get_cart_totals([self.user.pk])
+        )
+
+    def download(self, file_format, **headers):
+        response = self.client.get(self.url, {'format': file_format},
+                                   **headers)
+        if response.status_code == 200:
+            response.text = b''.join(response.streaming_content).decode()
+        return response
+
+    def test_formats(self):
+        expected = self.get_expected()
+        self.assertTrue(expected)
+        parsers = {
+            'txt': lambda text: [
+                (name, unit, int(amount)) for name, amount, unit in (
+                    re.fullmatch(r'(.+): (\d+) (.+)', line).groups()
+                    for line in text.splitlines()[2:]
+                )
+            ],
+            'csv': lambda text: [
+                (name, unit, int(amount))
+                for name, unit, amount in list(csv.reader(StringIO(text)))[1:]
+            ],
+            'json': lambda text: [
+                (row['name'], row['measurement_unit'], row['amount'])
+                for row in json.loads(text)
+            ],
+        }
+        for file_format, parse in parsers.items():
+            with self.subTest(file_format=file_format):
+                response = self.download(file_format)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    response['Content-Disposition'],
+                    f'attachment; filename=shopping-list.{file_format}',
+                )
+                self.assertEqual(sorted(parse(response.text)), expected)
+
+    def test_unknown_format(self):
+        self.assertEqual(self.download('pdf').status_code, 400)
+
+    def test_not_modified(self):
+        etag = self.download('txt')['ETag']
+        self.assertNotEqual(self.download('csv')['ETag'], etag)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.download('txt', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([
+            query['sql'] for query in captured.captured_queries
+            if 'recipes_cartingredient' in query['sql']
+        ])
+
+    def test_etag_changes(self):
+        recipe_id = Recipe.objects.exclude(
+            pk__in=ShoppingCart.objects.filter(
+                user=self.user
+            ).values('recipe')
+        ).exclude(ingredients=None).values_list('pk', flat=True).first()
+        ingredient = Ingredient.objects.filter(
+            pk__in=CartIngredient.objects.filter(
+                user=self.user
+            ).values('ingredient')
+        ).first()
+        changes = (
+            lambda: self.client.post(
+                f'/api/recipes/{recipe_id}/shopping_cart/'
+            ),
+            lambda: self.client.delete(
+                f'/api/recipes/{recipe_id}/shopping_cart/'
+            ),
+            lambda: Ingredient.objects.get(pk=ingredient.pk).save(),
+        )
+        for number, change in enumerate(changes):
+            with self.subTest(change=number):
+                etag = self.download('txt')['ETag']
+                change()
+                response = self.download('txt', HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    sorted(response.text.splitlines()[2:]),
+                    sorted(
+                        f'{name}: {amount} {unit}'
+                        for name, unit, amount in self.get_expected()
+                    ),
+                )
+
+
+class FeedTests(GeneratedDataTestCase):
+    """Лента из FeedEntry отдает те же страницы, что и JOIN подписок."""
+
+    def get_pages(self, join):
+        client = self.get_client(authenticated=True)
+        max_subscriptions = Subscribe.objects.count() if join else 0
+        pages, url = [], '/api/recipes/feed/?limit=3'
+        with mock.patch('recipes.feed.FEED_JOIN_MAX_SUBSCRIPTIONS',
+                        max_subscriptions):
+            while url:
+                response = client.get(url)
+                self.assertEqual(response.status_code, 200)
+                pages.append(
+                    [recipe['id'] for recipe in response.data['results']]
+                )
+                url = response.data['next']
+        return pages
+
+    def assertFeedsMatch(self, pages=None):
+        join_pages = self.get_pages(join=True)
+        fan_out_pages = self.get_pages(join=False)
+        self.assertGreater(len(join_pages), 1)
+        self.assertEqual(fan_out_pages[:pages], join_pages[:pages])
+
+    def test_feeds_match(self):
+        self.assertFeedsMatch()
+
+    def test_unsubscribe_from_popular_author(self):
+        author = User.objects.filter(
+            subscribing__user=self.user
+        ).order_by('-followers_count', 'pk').first()
+        follower = Subscribe.objects.filter(
+            subscribing=author
+        ).exclude(user=self.user).first()
+        with mock.patch('recipes.feed.FEED_FANOUT_MAX_FOLLOWERS',
+                        author.followers_count - 1):
+            for number in range(FEED_REQUEST_BACKFILL_RECIPES + 2):
+                Recipe.objects.create(
+                    author=author, name=f'Популярный {number}', text='-',
+                    cooking_time=1, image='recipes/images/popular.png',
+                )
+            self.assertFeedsMatch()
+            # Автор снова раскладывается по лентам: в запросе дописаны
+            # только последние рецепты, первая страница уже совпадает.
+            follower.delete()
+            self.assertFeedsMatch(pages=1)
+            call_command('rebuild_feeds', stdout=StringIO())
+            self.assertFeedsMatch()
+
+
+class RecipeListCacheTests(GeneratedDataTestCase):
+    """Кэш списка рецептов с общим для процессов кэшем."""
+    recipes = 10
+
+    @classmethod
+    def setUpClass(cls):
+        cache_dir = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        overridden = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': cache_dir,
+        }})
+        overridden.enable()
+        cls.addClassCleanup(overridden.disable)
+        super().setUpClass()
+
+    def setUp(self):
+        bump_cache_version(RECIPES_CACHE_NAME)
+
+    def test_cached_list(self):
+        client = self.get_client(authenticated=False)
+        response = client.get('/api/recipes/?limit=2')
+        with self.assertNumQueries(0):
+            cached = client.get('/api/recipes/?limit=2')
+        self.assertEqual(cached.data, response.data)
+        not_modified = client.get(
+            '/api/recipes/?limit=2', HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_recipe_change_resets_cache(self):
+        client = self.get_client(authenticated=False)
+        client.get('/api/recipes/?limit=2')
+        recipe = Recipe.objects.order_by('-pub_date').first()
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.name = 'Новое название'
+            recipe.save()
+        response = client.get('/api/recipes/?limit=2')
+        self.assertEqual(response.data['results'][0]['name'], recipe.name)
+
+    @override_settings(ALLOWED_HOSTS=['first.test', 'second.test'])
+    def test_page_links_follow_request(self):
+        client = self.get_client(authenticated=False)
+        client.get('/api/recipes/?limit=2&page=2', HTTP_HOST='first.test')
+        response = client.get(
+            '/api/recipes/?limit=2&page=2', HTTP_HOST='second.test'
+        )
+        self.assertEqual(
+            response.data['next'],
+            'http://second.test/api/recipes/?limit=2&page=3',
+        )
+        self.assertEqual(
+            response.data['previous'],
+            'http://second.test/api/recipes/?limit=2',
+        )
+
+
+class IterJsonArrayTests(SimpleTestCase):
+    """Потоковый разбор JSON-массива, в том числе на границах кусков."""
+    rows = [{'name': 'соль', 'measurement_unit': 'г'}, {'a': [1, {'b': ']'}]}]
+
+    def parse(self, text):
+        results = []
+        for chunk_size in (1, 3, 7, len(text) + 1):
+            with mock.patch.object(load_data, 'JSON_CHUNK_SIZE', chunk_size):
+                results.append(
+                    list(load_data.iter_json_array(StringIO(text)))
+                )
+        self.assertEqual(results, [results[0]] * len(results))
+        return results[0]
+
+    def test_rows(self):
+        text = json.dumps(self.rows, ensure_ascii=False, indent=2)
+        self.assertEqual(self.parse(text), self.rows)
+        self.assertEqual(self.parse(f'  {text}\n\n'), self.rows)
+        self.assertEqual(self.parse(' [ ] '), [])
+
+    def test_errors(self):
+        for text in ('{"a": 1}', '[{"a": 1}', '[{"a": 1} {"b": 2}]',
+                     '[{"a": 1},]', '[{"a": 1}] garbage', '[]]', ''):
+            with self.subTest(text=text):
+                with self.assertRaises(CommandError):
+                    self.parse(text)
+
+
+class LoadDataTests(TestCase):
+    """load_data через COPY (на PostgreSQL) и bulk_create, без дублей."""
+
+    @classmethod
+    def setUpClass(cls):
+        media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        overridden = override_settings(MEDIA_ROOT=media_root)
+        overridden.enable()
+        cls.addClassCleanup(overridden.disable)
+        super().setUpClass()
+
+    def setUp(self):
+        self.data_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.data_dir, ignore_errors=True)
+        for name in ('ingredients.csv', 'tags.json', 'recipes.json'):
+            shutil.copy(Path(settings.BASE_DIR) / 'data' / name, self.data_dir)
+        self.addCleanup(ingredient_index.invalidate)
+
+    def load(self, *datasets, **options):
+        call_command(
+            'load_data', *datasets, data_dir=self.data_dir, batch_size=100,
+            stdout=StringIO(), **options,
+        )
+
+    def get_counts(self):
+        return [model.objects.count()
+                for model in (Ingredient, Tag, Recipe, RecipeIngredient)]
+
+    def test_load(self):
+        for no_copy in (False, True):
+            with self.subTest(no_copy=no_copy):
+                with transaction.atomic():
+                    self.load('ingredients', 'tags', 'recipes',
+                              no_copy=no_copy)
+                    self.assertEqual(self.get_counts(), [2189, 3, 2, 10])
+                    transaction.set_rollback(True)
+
+    def test_rerun(self):
+        self.load('ingredients', 'tags', 'recipes')
+        counts = self.get_counts()
+        self.load('ingredients', 'tags', 'recipes')
+        self.load('ingredients', 'tags', 'recipes', no_copy=True)
+        self.assertEqual(self.get_counts(), counts)
+
+    def test_duplicates_in_file(self):
+        rows = [{'name': 'соль ', 'measurement_unit': 'г'},
+                {'name': 'соль', 'measurement_unit': 'г'},
+                {'name': 'соль', 'measurement_unit': 'щепотка'}]
+        (self.data_dir / 'extra.json').write_text(
+            json.dumps(rows, ensure_ascii=False), encoding='utf-8'
+        )
+        self.load('ingredients', ingredients_file='extra.json')
+        self.assertEqual(
+            sorted(Ingredient.objects.values_list(
+                'name', 'measurement_unit'
+            )),
+            [('соль', 'г'), ('соль', 'щепотка')],
+        )
+
+    def test_trailing_data(self):
+        (self.data_dir / 'extra.json').write_text(
+            '[{"name": "соль", "measurement_unit": "г"}] garbage',
+            encoding='utf-8',
+        )
+        with self.assertRaises(CommandError):
+            self.load('ingredients', ingredients_file='extra.json')
+
+
+class IngredientSearchTests(TestCase):
+    """Поиск ингредиентов по началу названия из индекса в памяти."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г') for name in (
+                'ежевичный сироп', 'Ёжевика', 'Еда', 'ёрш', 'Ель', 'мед',
+            )
+        )
+
+    def setUp(self):
+        ingredient_index.invalidate()
+        self.addCleanup(ingredient_index.invalidate)
+        self.client = APIClient()
+
+    def search(self, name):
+        response = self.client.get('/api/ingredients/', {'name': name})
+        self.assertEqual(response.status_code, 200)
+        return [ingredient['name'] for ingredient in response.data]
+
+    def test_yo_is_folded(self):
+        for name in ('еж', 'Ёж', 'ЕЖ'):
+            with self.subTest(name=name):
+                self.assertEqual(
+                    self.search(name), ['Ёжевика', 'ежевичный сироп']
+                )
+
+    def test_prefix_order(self):
+        self.assertEqual(
+            self.search('е'),
+            ['Еда', 'Ёжевика', 'ежевичный сироп', 'Ель', 'ёрш'],
+        )
+        self.assertEqual(self.search('мёд'), ['мед'])
+        self.assertEqual(self.search('ежевичн'), ['ежевичный сироп'])
+        self.assertEqual(self.search('ю'), [])
+
+    def test_index_is_not_rebuilt(self):
+        self.search('е')
+        with self.assertNumQueries(0):
+            self.search('м')
+
+    def test_index_is_reset_on_change(self):
+        self.search('е')
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='Ёмкость', measurement_unit='шт')
+        self.assertIn('Ёмкость', self.search('ем'))
+
+
+class ContentAddressedStorageTests(SimpleTestCase):
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        self.storage = ContentAddressedStorage(location=location)
+
+    def save_in_thread(self, name, content):
+        """Сохранение с ограничением по времени: зависание — провал теста."""
+        result = []
+        thread = Thread(
+            target=lambda: result.append(self.storage.save(name, content)),
+            daemon=True,
+        )
+        thread.start()
+        thread.join(timeout=5)
+        self.assertFalse(thread.is_alive(), "Сохранение зависло.")
+        return result[0]
+
+    def test_same_name_is_not_rewritten(self):
+        name = self.storage.save('images/same.png', ContentFile(b'first'))
+        self.assertEqual(
+            self.save_in_thread('images/same.png', ContentFile(b'first')),
+            name,
+        )
+        self.assertEqual(self.storage.listdir('images'), ([], ['same.png']))
+
+    def test_concurrent_save_of_same_name(self):
+        # Другая запись создала файл после проверки exists().
+        name = self.storage.save('images/race.png', ContentFile(b'race'))
+        with mock.patch.object(self.storage, 'exists', return_value=False):
+            self.assertEqual(
+                self.save_in_thread(name, ContentFile(b'race')), name
+            )
+        with self.storage.open(name) as file:
+            self.assertEqual(file.read(), b'race')
+
+    def test_content_addressed_name(self):
+        first = get_content_name('photo.PNG', ContentFile(b'image'))
+        self.assertEqual(
+            get_content_name('other.png', ContentFile(b'image')), first
+        )
+        self.assertNotEqual(
+            get_content_name('photo.png', ContentFile(b'changed')), first
+        )
+        self.assertTrue(first.endswith('.png'))
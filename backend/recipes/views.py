@@ -1,40 +1,68 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef, Value
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import urlencode
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import status, viewsets
+from rest_framework import generics, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
-from core.constants import SHOPPING_CART_FILENAME
-from .filters import IngredientSearchFilter, RecipeFilter
-from .models import Ingredient, Recipe, ShoppingCart, Tag
+from core.constants import (INGREDIENTS_CACHE_NAME, RECIPES_CACHE_NAME,
+                            SHOPPING_CART_FILENAME, SHORT_RECIPE_FIELDS,
+                            TAGS_CACHE_NAME)
+from core.deletion import delete_returning
+from core.mixins import CachedListMixin, OptionalCursorPaginationMixin
+from core.negotiation import IgnoreFormatContentNegotiation
+from core.pagination import LimitPageNumberPagination, RecipeCursorPagination
+from .counters import change_counters
+from .fast_read import get_recipe_rows, serialize_recipe_rows
+from .feed import get_feed
+from .filters import RecipeFilter
+from .ingredient_index import ingredient_index
+from .models import (CartIngredient, Favorite, Ingredient, Recipe,
+                     ShoppingCart, Tag)
 from .permissions import IsAuthorOrReadOnly
-from .serializers import (FavoriteSerializer, IngredientSerializer,
-                          RecipeCreateUpdateSerializer, RecipeReadSerializer,
+from .serializers import (CartIngredientSerializer, FavoriteSerializer,
+                          IngredientSerializer, RecipeCreateUpdateSerializer,
+                          RecipeIdsSerializer, RecipeReadSerializer,
                           ShoppingCartSerializer, TagSerializer)
+from .shopping_cart import (CONTENT_TYPES, RENDERERS, change_cart,
+                            get_cart_etag, get_cart_ingredients, locking_users)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CachedListMixin, viewsets.ReadOnlyModelViewSet):
+    cache_name = TAGS_CACHE_NAME
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CachedListMixin, viewsets.ReadOnlyModelViewSet):
+    cache_name = INGREDIENTS_CACHE_NAME
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
-    filter_backends = (IngredientSearchFilter,)
-    search_fields = ('^name',)
 
+    def get_list_data(self, request):
+        name = request.query_params.get('name')
+        if name:
+            return ingredient_index.search(name)
+        return ingredient_index.all()
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(CachedListMixin, OptionalCursorPaginationMixin,
+                    viewsets.ModelViewSet):
+    cache_name = RECIPES_CACHE_NAME
+    cursor_pagination_class = RecipeCursorPagination
     queryset = Recipe.objects.select_related(
-        'author').prefetch_related('ingredients__recipe', 'tags')
+        'author').prefetch_related('ingredients__ingredient', 'tags')
     serializer_class = RecipeCreateUpdateSerializer
     permission_classes = (IsAuthorOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
@@ -45,31 +73,179 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipeCreateUpdateSerializer
         return RecipeReadSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+            )
+        return queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+        )
+
+    def is_list_cacheable(self, request):
+        return request.user.is_anonymous and super().is_list_cacheable(
+            request
+        )
+
+    def get_list_cache_key(self, request):
+        names = (
+            *self.filterset_class.base_filters,
+            LimitPageNumberPagination.page_query_param,
+            LimitPageNumberPagination.page_size_query_param,
+            self.cursor_pagination_class.cursor_query_param,
+        )
+        return urlencode(sorted(
+            (name, value)
+            for name in names
+            for value in set(request.query_params.getlist(name))
+        ))
+
+    def get_list_data(self, request):
+        return self.get_page_response(
+            self.filter_queryset(self.get_queryset())
+        ).data
+
+    def get_page_response(self, queryset):
+        """
+        Страница рецептов; при RECIPE_FAST_READ — из строк values()
+        в обход RecipeReadSerializer (см. recipes.fast_read).
+        """
+        if not settings.RECIPE_FAST_READ:
+            page = self.paginate_queryset(queryset)
+            return self.get_paginated_response(
+                self.get_serializer(page, many=True).data
+            )
+        page = self.paginate_queryset(get_recipe_rows(queryset))
+        return self.get_paginated_response(
+            serialize_recipe_rows(page, self.request)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        if not settings.RECIPE_FAST_READ:
+            return super().retrieve(request, *args, **kwargs)
+        # Проверка прав на объект не нужна: на чтение рецепт открыт всем.
+        row = generics.get_object_or_404(
+            get_recipe_rows(self.filter_queryset(self.get_queryset())),
+            **{self.lookup_field: kwargs[self.lookup_field]},
+        )
+        return Response(serialize_recipe_rows([row], request)[0])
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def remove_recipes(self, model, recipe_ids):
+        """
+        Удаляет рецепты recipe_ids из избранного или списка покупок одним
+        DELETE без сигналов. Счетчики и суммы списка покупок сдвигаются
+        только по действительно удаленным строкам (RETURNING), поэтому
+        параллельное удаление той же строки не сдвинет их дважды.
+        Список покупок меняет версию в строке пользователя, поэтому она,
+        как и при добавлении, блокируется до DELETE: иначе удаление и
+        добавление того же рецепта ждали бы друг друга.
+        """
+        user_id = self.request.user.pk
+        if model is ShoppingCart:
+            atomic = locking_users([user_id])
+        else:
+            atomic = transaction.atomic(savepoint=False)
+        with atomic:
+            removed = delete_returning(
+                model, 'recipe', user=user_id, recipe=recipe_ids
+            )
+            if removed:
+                change_counters(model, removed, -1)
+                if model is ShoppingCart:
+                    change_cart(user_id, removed, -1)
+        return removed
+
     def post_delete_action(self, serializer_class, pk):
+        """
+        Добавление опирается на уникальное ограничение БД: один INSERT без
+        предварительной проверки, под блокировкой пользователя, как и
+        пакетное добавление. Удаление — один DELETE (remove_recipes).
+        """
+        model = serializer_class.Meta.model
         user = self.request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
-        object = serializer_class.Meta.model.objects.filter(
-            user=user, recipe=recipe
-        )
 
         if self.request.method == 'POST':
+            recipe = get_object_or_404(
+                Recipe.objects.only(*SHORT_RECIPE_FIELDS), pk=pk
+            )
+            try:
+                with locking_users([user.pk]):
+                    instance = model.objects.create(user=user, recipe=recipe)
+            except IntegrityError:
+                return Response(
+                    {api_settings.NON_FIELD_ERRORS_KEY: [
+                        serializer_class.already_added_message
+                    ]},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
             serializer = serializer_class(
-                data={'user': user.id, 'recipe': recipe.pk},
-                context={'request': self.request}
+                instance, context={'request': self.request}
             )
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        if self.request.method == 'DELETE':
-            if not object.exists():
-                return Response("Рецепт не был добавлен.",
-                                status=status.HTTP_400_BAD_REQUEST)
-            object.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+        if not self.remove_recipes(model, [int(pk)]):
+            get_object_or_404(Recipe.objects.only('id'), pk=pk)
+            return Response("Рецепт не был добавлен.",
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def batch_post_delete_action(self, model):
+        """
+        Добавление идет под блокировкой пользователя (locking_users), поэтому
+        выборка перед записью точно совпадает со вставляемыми строками.
+        Удаление — один DELETE, счетчики сдвигаются по удаленным строкам.
+        """
+        serializer = RecipeIdsSerializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        user = self.request.user
+        in_list = Recipe.objects.filter(id__in=recipe_ids).annotate(
+            in_list=Exists(model.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            ))
+        ).order_by().values_list('id', 'in_list')
+
+        if self.request.method == 'POST':
+            with locking_users([user.pk]):
+                in_list = dict(in_list)
+                changed = [pk for pk, exists in in_list.items() if not exists]
+                model.objects.bulk_create(
+                    model(user=user, recipe_id=pk) for pk in changed
+                )
+                change_counters(model, changed, 1)
+                if model is ShoppingCart:
+                    change_cart(user.pk, changed, 1)
+            changed_status, unchanged_status = 'added', 'already_added'
+        else:
+            in_list = dict(in_list)
+            changed = self.remove_recipes(
+                model, [pk for pk, exists in in_list.items() if exists]
+            )
+            changed_status, unchanged_status = 'removed', 'not_added'
+
+        changed = set(changed)
+        return Response({'results': [
+            {
+                'id': pk,
+                'status': (
+                    'not_found' if pk not in in_list
+                    else changed_status if pk in changed
+                    else unchanged_status
+                ),
+            }
+            for pk in recipe_ids
+        ]})
 
     @action(methods=['post', 'delete'],
             permission_classes=(IsAuthenticated,),
@@ -83,42 +259,71 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def shopping_cart(self, request, pk):
         return self.post_delete_action(ShoppingCartSerializer, pk)
 
+    @action(methods=['post', 'delete'],
+            permission_classes=(IsAuthenticated,),
+            detail=False,
+            url_path='favorite',
+            url_name='favorite-batch')
+    def favorite_batch(self, request):
+        return self.batch_post_delete_action(Favorite)
+
+    @action(methods=['post', 'delete'],
+            permission_classes=(IsAuthenticated,),
+            detail=False,
+            url_path='shopping_cart',
+            url_name='shopping-cart-batch')
+    def shopping_cart_batch(self, request):
+        return self.batch_post_delete_action(ShoppingCart)
+
     @action(methods=['get'],
             permission_classes=(IsAuthenticated,),
+            pagination_class=RecipeCursorPagination,
             detail=False)
-    def download_shopping_cart(self, request):
-        ingredients_in_cart = ShoppingCart.objects.filter(
-            user=request.user
-        ).values(
-            'recipe__ingredients__ingredient__name',
-            'recipe__ingredients__ingredient__measurement_unit',
-        ).order_by(
-            'recipe__ingredients__ingredient__name'
-        ).annotate(
-            total_amount=Sum('recipe__ingredients__amount')
-        )
-
-        shopping_cart = ['Список покупок\n\n']
+    def feed(self, request):
+        return self.get_page_response(self.filter_queryset(
+            get_feed(self.get_queryset(), request.user)
+        ))
 
-        for ingredient in ingredients_in_cart:
-            ingredient_name = ingredient[
-                'recipe__ingredients__ingredient__name'
-            ]
-            amount = ingredient['total_amount']
-            measurement_unit = ingredient[
-                'recipe__ingredients__ingredient__measurement_unit'
-            ]
+    @action(methods=['get'],
+            permission_classes=(IsAuthenticated,),
+            detail=False)
+    def shopping_cart_summary(self, request):
+        ingredients = CartIngredient.objects.filter(
+            user=request.user
+        ).select_related('ingredient').order_by('ingredient__name')
+        return Response({
+            'recipes_count': ShoppingCart.objects.filter(
+                user=request.user
+            ).count(),
+            'ingredients': CartIngredientSerializer(
+                ingredients, many=True
+            ).data,
+        })
 
-            shopping_cart.append(
-                f'{ingredient_name}: {amount} {measurement_unit}\n'
+    @action(methods=['get'],
+            permission_classes=(IsAuthenticated,),
+            content_negotiation_class=IgnoreFormatContentNegotiation,
+            detail=False)
+    def download_shopping_cart(self, request):
+        file_format = request.query_params.get('format', 'txt')
+        if file_format not in RENDERERS:
+            return Response(
+                f"Формат '{file_format}' не поддерживается.",
+                status=status.HTTP_400_BAD_REQUEST,
             )
 
-        return HttpResponse(
-            shopping_cart,
-            headers={
-                'Content-Type': 'text/plain',
-                'Content-Disposition': (
-                    f'attachment; filename={SHOPPING_CART_FILENAME}'
-                ),
-            },
+        etag = get_cart_etag(request.user, file_format)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        ingredients_in_cart = get_cart_ingredients(request.user)
+        response = StreamingHttpResponse(
+            RENDERERS[file_format](ingredients_in_cart),
+            content_type=CONTENT_TYPES[file_format],
+        )
+        response['ETag'] = etag
+        response['Content-Disposition'] = (
+            f'attachment; filename={SHOPPING_CART_FILENAME}.{file_format}'
         )
+        return response
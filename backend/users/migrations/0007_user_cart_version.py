@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-18 20:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_user_manager'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='cart_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='версия списка покупок'),
+        ),
+    ]
@@ -1,12 +1,18 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import UserManager as BaseUserManager
 from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.db import models
 
 from core.constants import MAX_EMAIL_LENGTH, MAX_USER_VALUE_LENGTH
+from core.deletion import CascadeDeleteMixin, CascadeDeleteQuerySet
 from core.validators import name_validator, validate_username
 
 
-class User(AbstractUser):
+class UserManager(BaseUserManager.from_queryset(CascadeDeleteQuerySet)):
+    pass
+
+
+class User(CascadeDeleteMixin, AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
@@ -32,6 +38,23 @@ class User(AbstractUser):
         max_length=MAX_USER_VALUE_LENGTH,
         validators=[name_validator],
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='количество рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='количество подписчиков',
+        default=0,
+        editable=False,
+    )
+    cart_version = models.PositiveIntegerField(
+        verbose_name='версия списка покупок',
+        default=0,
+        editable=False,
+    )
+
+    objects = UserManager()
 
     class Meta:
         ordering = ('-username',)
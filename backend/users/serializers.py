@@ -4,6 +4,15 @@ from rest_framework.validators import UniqueTogetherValidator
 from .models import Subscribe, User
 
 
+def get_subscribed_ids(user, author_ids):
+    """Авторы из author_ids, на которых подписан пользователь."""
+    if user.is_anonymous:
+        return set()
+    return set(user.subscriber.filter(
+        subscribing_id__in=author_ids
+    ).values_list('subscribing_id', flat=True))
+
+
 class UserSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
@@ -18,11 +27,34 @@ class UserSerializer(serializers.ModelSerializer):
             'is_subscribed',
         )
 
+    def get_user_ids(self):
+        """
+        Пользователи всего ответа: сами сериализуемые объекты или, для
+        вложенного поля (автор рецепта), значения его внешнего ключа.
+        """
+        root = self.root
+        objects = root.instance
+        if not isinstance(root, serializers.ListSerializer):
+            objects = [objects]
+        if self is root or (
+            self.parent is root
+            and isinstance(root, serializers.ListSerializer)
+        ):
+            return {obj.pk for obj in objects}
+        return {getattr(obj, f'{self.source}_id') for obj in objects}
+
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context['request']
         if request.user.is_anonymous or (request.user == obj):
             return False
-        return request.user.subscriber.filter(subscribing=obj).exists()
+        root = self.root
+        if not hasattr(root, 'subscribed_ids'):
+            root.subscribed_ids = get_subscribed_ids(
+                request.user, self.get_user_ids() - {request.user.pk}
+            )
+        return obj.id in root.subscribed_ids
 
 
 class SubscribeSerializer(serializers.ModelSerializer):
@@ -0,0 +1,32 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from core.authentication import invalidate_user_tokens
+from .models import User
+
+
+def invalidate_on_commit(user_id):
+    """
+    Сбрасывает сразу и после коммита: иначе конкурентный запрос успеет
+    закэшировать еще не измененного пользователя.
+    """
+    invalidate_user_tokens(user_id)
+    transaction.on_commit(partial(invalidate_user_tokens, user_id))
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_user(sender, instance, update_fields=None, **kwargs):
+    """Смена пароля, деактивация, удаление и любая правка профиля."""
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    invalidate_on_commit(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(sender, instance, **kwargs):
+    """Выход через djoser удаляет токен."""
+    invalidate_on_commit(instance.user_id)
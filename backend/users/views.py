@@ -1,15 +1,19 @@
+from django.db.models import OuterRef, Prefetch, Subquery, Value
 from django.shortcuts import get_object_or_404
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
-from recipes.serializers import UserSubscribeSerializer
+from core.mixins import OptionalCursorPaginationMixin
+from core.pagination import UserCursorPagination
+from recipes.models import Recipe
+from recipes.serializers import UserSubscribeSerializer, get_recipes_limit
 from .models import Subscribe, User
 from .serializers import SubscribeSerializer, UserSerializer
 
 
-class UserViewSet(viewsets.GenericViewSet):
+class UserViewSet(OptionalCursorPaginationMixin, viewsets.GenericViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = (AllowAny,)
@@ -17,12 +21,23 @@ class UserViewSet(viewsets.GenericViewSet):
     @action(methods=['get'],
             serializer_class=UserSubscribeSerializer,
             permission_classes=(IsAuthenticated,),
+            cursor_pagination_class=UserCursorPagination,
             detail=False)
     def subscriptions(self, request):
-        subscriptions = (
-            User.objects.filter(
-                subscribing__user=self.request.user
-            )
+        recipes = Recipe.objects.all()
+        recipes_limit = get_recipes_limit(request)
+        if recipes_limit > 0:
+            recipes = recipes.filter(id__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).values('id')[:recipes_limit]
+            ))
+        subscriptions = User.objects.filter(
+            subscribing__user=self.request.user
+        ).annotate(
+            is_subscribed=Value(True),
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes)
         )
         page = self.paginate_queryset(subscriptions)
         serializer = self.get_serializer(page, many=True)